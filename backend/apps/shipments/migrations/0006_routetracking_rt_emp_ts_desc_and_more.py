@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-15 22:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shipments', '0005_shipment_dispatch_sequence_shipment_dispatched_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='routetracking',
+            index=models.Index(fields=['employee_id', '-timestamp'], name='rt_emp_ts_desc'),
+        ),
+        migrations.AddIndex(
+            model_name='routetracking',
+            index=models.Index(fields=['session', '-timestamp'], name='rt_sess_ts_desc'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-15 22:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shipments', '0006_routetracking_rt_emp_ts_desc_and_more'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='shipment',
+            name='shipments_employe_1f5ee4_idx',
+        ),
+        migrations.AddIndex(
+            model_name='shipment',
+            index=models.Index(fields=['employee_id', 'status'], name='shipments_employe_bc6d80_idx'),
+        ),
+    ]
@@ -142,7 +142,9 @@ class Shipment(models.Model):
     class Meta:
         db_table = 'shipments'
         indexes = [
-            models.Index(fields=['employee_id']),
+            # Rider-scoped lookups usually filter on status too; the
+            # employee_id prefix still serves employee-only filters
+            models.Index(fields=['employee_id', 'status']),
             models.Index(fields=['created_at']),
             models.Index(fields=['synced_to_external', 'sync_status']),
             models.Index(fields=['status', 'type', 'route_name', 'created_at']),
@@ -154,6 +156,20 @@ class Shipment(models.Model):
     
     def __str__(self):
         return f"Shipment {self.id} - {self.customer_name}"
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # Remember the status as loaded so the status-change signal can diff
+        # in memory instead of re-reading the row on every save
+        instance = super().from_db(db, field_names, values)
+        if 'status' not in instance.get_deferred_fields():
+            instance._loaded_status = instance.status
+        return instance
+    
+    def refresh_from_db(self, using=None, fields=None):
+        super().refresh_from_db(using=using, fields=fields)
+        if 'status' not in self.get_deferred_fields():
+            self._loaded_status = self.status
 
 
 class Acknowledgment(models.Model):
@@ -297,6 +313,9 @@ class RouteTracking(models.Model):
             models.Index(fields=['date']),
             models.Index(fields=['timestamp']),
             models.Index(fields=['employee_id', 'date']),
+            # Latest-point lookups per rider / per session
+            models.Index(fields=['employee_id', '-timestamp'], name='rt_emp_ts_desc'),
+            models.Index(fields=['session', '-timestamp'], name='rt_sess_ts_desc'),
         ]
     
     def __str__(self):
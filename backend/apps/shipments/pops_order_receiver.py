@@ -3,19 +3,187 @@ POPS Order Receiver
 Handles receiving orders from POPS and creating shipments in RiderPro
 """
 import logging
-from typing import Optional, Dict, Any
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Tuple
+from django.db import transaction
 from django.utils import timezone
 from django.utils.dateparse import parse_datetime
-from .models import Shipment
+from .models import Shipment, OrderEvent
 from .services import ShipmentStatusService
 
 logger = logging.getLogger(__name__)
 
+# POPS status -> RiderPro status
+POPS_STATUS_MAPPING = {
+    'INITIATED': 'Initiated',
+    'ASSIGNED': 'Assigned',
+    'COLLECTED': 'Collected',
+    'IN_TRANSIT': 'In Transit',
+    'DELIVERED': 'Delivered',
+    'PICKED_UP': 'Picked Up',
+    'RETURNED': 'Returned',
+    'CANCELLED': 'Cancelled',
+}
+
+
+def _parse_dt(value, default: datetime) -> datetime:
+    """
+    Parse a POPS timestamp (ISO string, 'Z' suffix allowed, or datetime),
+    falling back to default when missing or unparseable
+    """
+    if isinstance(value, str):
+        try:
+            return parse_datetime(value) or default
+        except ValueError:
+            return default
+    if isinstance(value, datetime):
+        return value
+    return default
+
+
+# POPS payload key -> (canonical field, precedence). When several aliases of
+# the same field are present and truthy, the lowest precedence wins, matching
+# the order the payload formats have historically been checked in.
+_ALIASES = {
+    'address': ('address', 0),
+    'deliveryAddress': ('address', 1),
+    'latitude': ('latitude', 0),
+    'lat': ('latitude', 1),
+    'longitude': ('longitude', 0),
+    'lng': ('longitude', 1),
+    'lon': ('longitude', 2),
+    'pickupAddress': ('pickup_address', 0),
+    'pickup_address': ('pickup_address', 1),
+    'deliveryTime': ('delivery_time', 0),
+    'estimatedDeliveryTime': ('delivery_time', 1),
+    'delivery_time': ('delivery_time', 2),
+    'packageBoxes': ('package_boxes', 0),
+    'package_boxes': ('package_boxes', 1),
+    'hubJobEntries': ('hub_job_entries', 0),
+    'hub_job_entries': ('hub_job_entries', 1),
+    'recipientName': ('customer_name', 0),
+    'customerName': ('customer_name', 1),
+    'recipientPhone': ('customer_mobile', 0),
+    'customerMobile': ('customer_mobile', 1),
+    'routeName': ('route_name', 0),
+    'route_name': ('route_name', 1),
+    'specialInstructions': ('special_instructions', 0),
+    'special_instructions': ('special_instructions', 1),
+    'shipment_uuid': ('pops_shipment_uuid', 0),
+    'pops_shipment_uuid': ('pops_shipment_uuid', 1),
+}
+
+
+def _extract_fields(order_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Collect aliased POPS fields in a single pass over the payload, keeping
+    the first truthy value by alias precedence
+    """
+    out = {}
+    ranks = {}
+    for key, value in order_data.items():
+        alias = _ALIASES.get(key)
+        if alias is None or not value:
+            continue
+        field, rank = alias
+        if rank < ranks.get(field, len(_ALIASES)):
+            out[field] = value
+            ranks[field] = rank
+    return out
+
+
+def _build_shipment(
+    order_data: Dict[str, Any],
+    order_id,
+    employee_id: str,
+    api_source: Optional[str],
+    now: datetime
+) -> Shipment:
+    """Map a POPS order payload onto an unsaved Shipment"""
+    fields = _extract_fields(order_data)
+
+    # Extract address data
+    address = fields.get('address') or {}
+    if isinstance(address, str):
+        # If address is a string, convert to dict format
+        address = {'formattedAddress': address}
+    
+    # Extract coordinates from address or separate fields
+    latitude = None
+    longitude = None
+    
+    if isinstance(address, dict):
+        latitude = address.get('latitude') or address.get('lat')
+        longitude = address.get('longitude') or address.get('lng') or address.get('lon')
+    
+    # Fallback to separate coordinate fields
+    if not latitude:
+        latitude = fields.get('latitude')
+    if not longitude:
+        longitude = fields.get('longitude')
+    
+    # Extract pickup address
+    pickup_address = fields.get('pickup_address')
+    if isinstance(pickup_address, str):
+        pickup_address = {'formattedAddress': pickup_address}
+    
+    # Extract delivery time
+    delivery_time = _parse_dt(fields.get('delivery_time'), now)
+    
+    # Extract package boxes
+    package_boxes = fields.get('package_boxes')
+    
+    # Extract weight (aggregate from package boxes if available)
+    weight = order_data.get('weight', 0)
+    if package_boxes and isinstance(package_boxes, list):
+        total_weight = sum(box.get('weight', 0) for box in package_boxes if isinstance(box, dict))
+        if total_weight > 0:
+            weight = total_weight
+    
+    # Determine shipment type
+    shipment_type = order_data.get('type', 'delivery')
+    if shipment_type not in ['delivery', 'pickup']:
+        shipment_type = 'delivery'  # Default to delivery
+
+    # Extract PIA hub job entries (paired hubjob_id + bill_code list). Stored
+    # verbatim; only persisted when it's a non-empty list of pairs.
+    hub_job_entries = fields.get('hub_job_entries')
+    if not isinstance(hub_job_entries, list):
+        hub_job_entries = None
+    
+    return Shipment(
+        pops_order_id=int(order_id) if order_id else None,
+        type=shipment_type,
+        customer_name=fields.get('customer_name', ''),
+        customer_mobile=fields.get('customer_mobile', ''),
+        address=address if isinstance(address, dict) else {'formattedAddress': str(address)},
+        latitude=float(latitude) if latitude else None,
+        longitude=float(longitude) if longitude else None,
+        pickup_address=pickup_address if isinstance(pickup_address, dict) else None,
+        cost=float(order_data.get('cost', 0)),
+        delivery_time=delivery_time,
+        route_name=fields.get('route_name', ''),
+        employee_id=employee_id if employee_id and employee_id != "N/A" else "unassigned",
+        status='Assigned' if employee_id and employee_id != "N/A" else 'Initiated',
+        weight=float(weight),
+        package_boxes=package_boxes if isinstance(package_boxes, (list, dict)) else None,
+        special_instructions=fields.get('special_instructions'),
+        remarks=order_data.get('remarks'),
+        priority=order_data.get('priority', 'medium'),
+        api_source=api_source,
+        pops_shipment_uuid=fields.get('pops_shipment_uuid'),
+        hub_job_entries=hub_job_entries,
+        region=order_data.get('region'),
+        synced_to_external=True,  # Mark as synced since it came from POPS
+        sync_status='synced'
+    )
+
 
 def receive_order_from_pops(
     order_data: Dict[str, Any],
     employee_id: str,
-    api_source: Optional[str] = None
+    api_source: Optional[str] = None,
+    now: Optional[datetime] = None
 ) -> Optional[Shipment]:
     """
     Receive an order from POPS and create a shipment in RiderPro
@@ -24,10 +192,13 @@ def receive_order_from_pops(
         order_data: Order data from POPS (dict with orderId, deliveryAddress, etc.)
         employee_id: Employee/rider ID assigned to this order
         api_source: Source of the API call (for tracking)
+        now: Reference time for defaults (lets batch callers share one clock read)
     
     Returns:
         Created Shipment instance or None if creation failed
     """
+    if now is None:
+        now = timezone.now()
     try:
         # Extract order ID
         order_id = order_data.get('orderId') or order_data.get('order_id')
@@ -41,88 +212,9 @@ def receive_order_from_pops(
             logger.info(f"Shipment already exists for orderId={order_id}, shipment_id={existing_shipment.id}")
             return existing_shipment
         
-        # Extract address data
-        address = order_data.get('address') or order_data.get('deliveryAddress') or {}
-        if isinstance(address, str):
-            # If address is a string, convert to dict format
-            address = {'formattedAddress': address}
-        
-        # Extract coordinates from address or separate fields
-        latitude = None
-        longitude = None
-        
-        if isinstance(address, dict):
-            latitude = address.get('latitude') or address.get('lat')
-            longitude = address.get('longitude') or address.get('lng') or address.get('lon')
-        
-        # Fallback to separate coordinate fields
-        if not latitude:
-            latitude = order_data.get('latitude') or order_data.get('lat')
-        if not longitude:
-            longitude = order_data.get('longitude') or order_data.get('lng') or order_data.get('lon')
-        
-        # Extract pickup address
-        pickup_address = order_data.get('pickupAddress') or order_data.get('pickup_address')
-        if isinstance(pickup_address, str):
-            pickup_address = {'formattedAddress': pickup_address}
-        
-        # Extract delivery time
-        delivery_time_str = order_data.get('deliveryTime') or order_data.get('estimatedDeliveryTime') or order_data.get('delivery_time')
-        delivery_time = None
-        if delivery_time_str:
-            if isinstance(delivery_time_str, str):
-                delivery_time = parse_datetime(delivery_time_str)
-            elif hasattr(delivery_time_str, 'isoformat'):
-                delivery_time = delivery_time_str
-        
-        # Extract package boxes
-        package_boxes = order_data.get('packageBoxes') or order_data.get('package_boxes')
-        
-        # Extract weight (aggregate from package boxes if available)
-        weight = order_data.get('weight', 0)
-        if package_boxes and isinstance(package_boxes, list):
-            total_weight = sum(box.get('weight', 0) for box in package_boxes if isinstance(box, dict))
-            if total_weight > 0:
-                weight = total_weight
-        
-        # Determine shipment type
-        shipment_type = order_data.get('type', 'delivery')
-        if shipment_type not in ['delivery', 'pickup']:
-            shipment_type = 'delivery'  # Default to delivery
-
-        # Extract PIA hub job entries (paired hubjob_id + bill_code list). Stored
-        # verbatim; only persisted when it's a non-empty list of pairs.
-        hub_job_entries = order_data.get('hubJobEntries') or order_data.get('hub_job_entries')
-        if not isinstance(hub_job_entries, list) or not hub_job_entries:
-            hub_job_entries = None
-        
         # Create shipment
-        shipment = Shipment.objects.create(
-            pops_order_id=int(order_id) if order_id else None,
-            type=shipment_type,
-            customer_name=order_data.get('recipientName') or order_data.get('customerName') or '',
-            customer_mobile=order_data.get('recipientPhone') or order_data.get('customerMobile') or '',
-            address=address if isinstance(address, dict) else {'formattedAddress': str(address)},
-            latitude=float(latitude) if latitude else None,
-            longitude=float(longitude) if longitude else None,
-            pickup_address=pickup_address if isinstance(pickup_address, dict) else None,
-            cost=float(order_data.get('cost', 0)),
-            delivery_time=delivery_time or timezone.now(),
-            route_name=order_data.get('routeName') or order_data.get('route_name') or '',
-            employee_id=employee_id if employee_id and employee_id != "N/A" else "unassigned",
-            status='Assigned' if employee_id and employee_id != "N/A" else 'Initiated',
-            weight=float(weight),
-            package_boxes=package_boxes if isinstance(package_boxes, (list, dict)) else None,
-            special_instructions=order_data.get('specialInstructions') or order_data.get('special_instructions'),
-            remarks=order_data.get('remarks'),
-            priority=order_data.get('priority', 'medium'),
-            api_source=api_source,
-            pops_shipment_uuid=order_data.get('shipment_uuid') or order_data.get('pops_shipment_uuid'),
-            hub_job_entries=hub_job_entries,
-            region=order_data.get('region'),
-            synced_to_external=True,  # Mark as synced since it came from POPS
-            sync_status='synced'
-        )
+        shipment = _build_shipment(order_data, order_id, employee_id, api_source, now)
+        shipment.save(force_insert=True)
         
         # Create initial event
         ShipmentStatusService.create_event(
@@ -149,6 +241,92 @@ def receive_order_from_pops(
         return None
 
 
+def receive_orders_from_pops_bulk(
+    orders: List[Tuple[Dict[str, Any], str]],
+    api_source: Optional[str] = None
+) -> List[Optional[Shipment]]:
+    """
+    Receive a batch of POPS orders with one lookup for existing orders and a
+    single bulk INSERT for new shipments and their 'order_received' events.
+    
+    Args:
+        orders: (order_data, employee_id) pairs, in payload order
+        api_source: Source of the API call (for tracking)
+    
+    Returns:
+        One entry per input pair: the new or already existing Shipment, or None
+        when that order could not be mapped
+    """
+    from .signals import queue_created_callbacks
+
+    now = timezone.now()
+    results: List[Optional[Shipment]] = [None] * len(orders)
+
+    order_ids = []
+    for index, (order_data, _) in enumerate(orders):
+        order_id = order_data.get('orderId') or order_data.get('order_id')
+        try:
+            order_ids.append(int(order_id) if order_id else None)
+        except (TypeError, ValueError):
+            order_ids.append(None)
+            logger.error(f"Order {index + 1}: invalid orderId {order_id!r}")
+
+    existing = {
+        shipment.pops_order_id: shipment
+        for shipment in Shipment.objects.filter(pops_order_id__in={oid for oid in order_ids if oid})
+    }
+
+    to_create = {}
+    for index, ((order_data, employee_id), order_id) in enumerate(zip(orders, order_ids)):
+        if not order_id:
+            continue
+        if order_id in existing:
+            results[index] = existing[order_id]
+            continue
+        if order_id in to_create:
+            # Same order twice in one batch: first occurrence wins
+            continue
+        try:
+            to_create[order_id] = (
+                index, employee_id, _build_shipment(order_data, order_id, employee_id, api_source, now)
+            )
+        except Exception as e:
+            logger.error(f"Order {index + 1} (orderId: {order_id}): failed to map POPS order: {e}")
+
+    if to_create:
+        with transaction.atomic():
+            created = Shipment.objects.bulk_create(
+                [shipment for _, _, shipment in to_create.values()], batch_size=500
+            )
+            OrderEvent.objects.bulk_create([
+                OrderEvent(
+                    shipment=shipment,
+                    event_type='order_received',
+                    metadata={
+                        'source': 'pops',
+                        'order_id': order_id,
+                        'employee_id': employee_id,
+                        'api_source': api_source
+                    },
+                    triggered_by='pops_system'
+                )
+                for order_id, (_, employee_id, shipment) in to_create.items()
+            ], batch_size=500)
+            # bulk_create skips post_save, so queue the creation callbacks here
+            queue_created_callbacks(created)
+
+    # Duplicates of an order created in this batch resolve to that shipment
+    for index, order_id in enumerate(order_ids):
+        if results[index] is None and order_id in to_create:
+            results[index] = to_create[order_id][2]
+
+    logger.info(
+        f"Batch received from {api_source or 'unknown source'}: {len(orders)} orders, "
+        f"{len(to_create)} created, {len(existing)} already existed"
+    )
+    return results
+
+
 def update_shipment_status_from_pops(
     shipment_id: int,
     status: str,
@@ -166,42 +344,106 @@ def update_shipment_status_from_pops(
         True if update successful, False otherwise
     """
     try:
-        shipment = Shipment.objects.get(id=shipment_id)
+        riderpro_status = POPS_STATUS_MAPPING.get(status.upper(), status)
         
-        # Map POPS status to RiderPro status
-        status_mapping = {
-            'INITIATED': 'Initiated',
-            'ASSIGNED': 'Assigned',
-            'COLLECTED': 'Collected',
-            'IN_TRANSIT': 'In Transit',
-            'DELIVERED': 'Delivered',
-            'PICKED_UP': 'Picked Up',
-            'RETURNED': 'Returned',
-            'CANCELLED': 'Cancelled',
-        }
+        # The status UPDATE and its event commit together, and the row lock
+        # keeps old_status accurate against a concurrent update
+        with transaction.atomic():
+            old_status = Shipment.objects.select_for_update().filter(
+                id=shipment_id
+            ).values_list('status', flat=True).first()
+            if old_status is None:
+                logger.error(f"Shipment {shipment_id} not found")
+                return False
+            
+            # Single UPDATE, no model save: the status came from POPS, so it is
+            # already in sync and there is no outbound callback to fire (#10)
+            Shipment.objects.filter(id=shipment_id).update(
+                status=riderpro_status,
+                synced_to_external=True,
+                sync_status='synced',
+                updated_at=timezone.now()
+            )
+            OrderEvent.objects.create(
+                shipment_id=shipment_id,
+                event_type='status_change',
+                old_status=old_status,
+                new_status=riderpro_status,
+                triggered_by='pops_system',
+                metadata={
+                    'source': 'pops',
+                    'pops_status': status,
+                    'order_id': order_id
+                }
+            )
         
-        riderpro_status = status_mapping.get(status.upper(), status)
+        logger.info(f"Updated shipment {shipment_id} status to {riderpro_status} from POPS")
+        return True
         
-        # Update status using ShipmentStatusService
-        ShipmentStatusService.update_status(
-            shipment,
+    except Exception as e:
+        logger.error(f"Failed to update shipment status from POPS: {e}", exc_info=True)
+        return False
+
+
+def bulk_update_shipment_status_from_pops(
+    updates: List[Tuple[int, str, Optional[int]]]
+) -> Dict[int, bool]:
+    """
+    Apply a cluster of POPS status updates with one SELECT, one UPDATE per
+    distinct target status and a single bulk INSERT of status_change events
+    
+    Args:
+        updates: (shipment_id, pops_status, order_id) tuples; later entries for
+            the same shipment win
+    
+    Returns:
+        Mapping of shipment_id -> True if updated, False if not found/invalid
+    """
+    latest = {}
+    invalid = {}
+    for shipment_id, status, order_id in updates:
+        try:
+            latest[int(shipment_id)] = (status, order_id)
+        except (TypeError, ValueError):
+            invalid[shipment_id] = False
+
+    old_statuses = dict(
+        Shipment.objects.filter(id__in=list(latest)).values_list('id', 'status')
+    )
+
+    by_status = {}
+    events = []
+    for shipment_id, (status, order_id) in latest.items():
+        if shipment_id not in old_statuses:
+            continue
+        riderpro_status = POPS_STATUS_MAPPING.get(status.upper(), status)
+        by_status.setdefault(riderpro_status, []).append(shipment_id)
+        events.append(OrderEvent(
+            shipment_id=shipment_id,
+            event_type='status_change',
+            old_status=old_statuses[shipment_id],
             new_status=riderpro_status,
             triggered_by='pops_system',
             metadata={
                 'source': 'pops',
                 'pops_status': status,
                 'order_id': order_id
-            },
-            sync_to_pops=False  # Don't sync back to POPS since update came from POPS
-        )
-        
-        logger.info(f"Updated shipment {shipment_id} status to {riderpro_status} from POPS")
-        return True
-        
-    except Shipment.DoesNotExist:
-        logger.error(f"Shipment {shipment_id} not found")
-        return False
-    except Exception as e:
-        logger.error(f"Failed to update shipment status from POPS: {e}", exc_info=True)
-        return False
+            }
+        ))
+
+    now = timezone.now()
+    with transaction.atomic():
+        for riderpro_status, shipment_ids in by_status.items():
+            Shipment.objects.filter(id__in=shipment_ids).update(
+                status=riderpro_status,
+                synced_to_external=True,
+                sync_status='synced',
+                updated_at=now
+            )
+        OrderEvent.objects.bulk_create(events, batch_size=500)
 
+    logger.info(f"Updated {len(events)} of {len(latest)} shipment statuses from POPS")
+    return {
+        **invalid,
+        **{shipment_id: shipment_id in old_statuses for shipment_id in latest},
+    }
@@ -2,24 +2,56 @@
 Serializers for shipments app
 Includes route tracking serializers
 """
+import math
+import sys
+from dataclasses import dataclass
+from datetime import datetime
+from functools import lru_cache
+
+from django.db import models
+from django.db.models import CharField, Func, Prefetch, Value
+from django.db.models.fields.json import KeyTextTransform
+from django.db.models.functions import Coalesce, NullIf
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from rest_framework import serializers
+from rest_framework.fields import SkipField
+from rest_framework.relations import PKOnlyObject
+from rest_framework.utils import html
 from .models import Shipment, Acknowledgment, RouteSession, RouteTracking, AcknowledgmentSettings
 
+NO_ADDRESS = sys.intern('No address')
+
 
 def format_address(address_data):
     """
     Format address JSON object into a readable string.
     Handles both dict and string addresses.
     """
+    # Legacy rows store the address as a plain string; exact type check first
+    if type(address_data) is str:
+        return address_data or NO_ADDRESS
+
     if not address_data:
-        return 'No address'
-    
-    if isinstance(address_data, str):
-        return address_data
+        return NO_ADDRESS
     
     if not isinstance(address_data, dict):
         return str(address_data)
     
+    # List responses repeat the same few pickup/delivery addresses, so memoize
+    # on the dict contents. Nested/unhashable values skip the cache.
+    try:
+        return _format_address_cached(tuple(sorted(address_data.items())))
+    except TypeError:
+        return _format_address_dict(address_data)
+
+
+@lru_cache(maxsize=2048)
+def _format_address_cached(key):
+    return _format_address_dict(dict(key))
+
+
+def _format_address_dict(address_data):
     # Build address string from object fields
     parts = []
     
@@ -41,7 +73,55 @@ def format_address(address_data):
     if address_data.get('country'):
         parts.append(str(address_data['country']))
     
-    return ', '.join(parts) if parts else 'No address'
+    return ', '.join(parts) if parts else NO_ADDRESS
+
+
+class CachedListSerializer(serializers.ListSerializer):
+    """
+    many=True rendering that resolves the child's readable fields once per
+    response instead of once per row. Equivalent to Serializer.to_representation,
+    so only attach it to serializers that don't override to_representation.
+    """
+
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.manager.BaseManager) else data
+        fields = list(self.child._readable_fields)
+
+        ret = []
+        for instance in iterable:
+            row = {}
+            for field in fields:
+                try:
+                    attribute = field.get_attribute(instance)
+                except SkipField:
+                    continue
+                check_for_none = attribute.pk if isinstance(attribute, PKOnlyObject) else attribute
+                if check_for_none is None:
+                    row[field.field_name] = None
+                else:
+                    row[field.field_name] = field.to_representation(attribute)
+            ret.append(row)
+        return ret
+
+
+# Field lists shared by the shipment serializers, built once at import time
+_CORE_SHIPMENT_FIELDS = (
+    'id', 'type', 'customer_name', 'customer_mobile', 'address',
+    'latitude', 'longitude', 'cost', 'delivery_time', 'route_name',
+    'employee_id', 'status', 'pickup_address', 'weight', 'package_boxes',
+    'special_instructions',
+)
+
+_SHIPMENT_DETAIL_FIELDS = (
+    'actual_delivery_time', 'priority', 'remarks',
+    'start_latitude', 'start_longitude', 'stop_latitude', 'stop_longitude',
+    'km_travelled', 'synced_to_external', 'sync_status', 'sync_attempts',
+    'signature_url', 'photo_url', 'pdf_url', 'signed_pdf_url',
+    'acknowledgment_captured_at', 'acknowledgment_captured_by',
+    'pops_order_id', 'pops_shipment_uuid', 'hub_job_entries', 'api_source', 'region',
+    'dispatch_sequence', 'dispatched_at',
+    'created_at', 'updated_at', 'address_display',
+)
 
 
 class ShipmentSerializer(serializers.ModelSerializer):
@@ -52,24 +132,35 @@ class ShipmentSerializer(serializers.ModelSerializer):
     
     def get_address_display(self, obj):
         """Format address for display"""
-        return format_address(obj.address)
+        # Prefer the value computed by the database (see address_display_expression);
+        # string/legacy addresses come back NULL there and are formatted here
+        return getattr(obj, '_addr_display', None) or format_address(obj.address)
+
+    @staticmethod
+    def address_display_expression():
+        """
+        SQL equivalent of format_address for dict addresses, for use as
+        .annotate(_addr_display=...). Yields NULL when no part is present.
+        """
+        def part(key):
+            return NullIf(KeyTextTransform(key, 'address'), Value(''))
+
+        return NullIf(
+            Func(
+                Value(', '),
+                Coalesce(part('address'), part('place_name')),
+                part('city'), part('state'), part('pincode'), part('country'),
+                function='CONCAT_WS',
+                output_field=CharField(),
+            ),
+            Value(''),
+        )
 
     class Meta:
         model = Shipment
-        fields = [
-            'id', 'type', 'customer_name', 'customer_mobile', 'address',
-            'latitude', 'longitude', 'cost', 'delivery_time', 'route_name',
-            'employee_id', 'status', 'pickup_address', 'weight', 'package_boxes',
-            'special_instructions', 'actual_delivery_time', 'priority', 'remarks',
-            'start_latitude', 'start_longitude', 'stop_latitude', 'stop_longitude',
-            'km_travelled', 'synced_to_external', 'sync_status', 'sync_attempts',
-            'signature_url', 'photo_url', 'pdf_url', 'signed_pdf_url',
-            'acknowledgment_captured_at', 'acknowledgment_captured_by',
-            'pops_order_id', 'pops_shipment_uuid', 'hub_job_entries', 'api_source', 'region',
-            'dispatch_sequence', 'dispatched_at',
-            'created_at', 'updated_at', 'address_display',
-        ]
+        fields = _CORE_SHIPMENT_FIELDS + _SHIPMENT_DETAIL_FIELDS
         read_only_fields = ['id', 'created_at', 'updated_at', 'dispatch_sequence', 'dispatched_at']
+        list_serializer_class = CachedListSerializer
 
 
 class ShipmentCreateSerializer(serializers.ModelSerializer):
@@ -77,12 +168,7 @@ class ShipmentCreateSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Shipment
-        fields = [
-            'id', 'type', 'customer_name', 'customer_mobile', 'address',
-            'latitude', 'longitude', 'cost', 'delivery_time', 'route_name',
-            'employee_id', 'status', 'pickup_address', 'weight', 'package_boxes',
-            'special_instructions', 'priority', 'pops_order_id', 'pops_shipment_uuid'
-        ]
+        fields = _CORE_SHIPMENT_FIELDS + ('priority', 'pops_order_id', 'pops_shipment_uuid')
 
 
 class ShipmentUpdateSerializer(serializers.ModelSerializer):
@@ -99,6 +185,8 @@ class ShipmentUpdateSerializer(serializers.ModelSerializer):
 
 class AcknowledgmentSerializer(serializers.ModelSerializer):
     """Acknowledgment serializer"""
+    # Read straight from the shipment_id column; never dereference obj.shipment
+    shipment = serializers.PrimaryKeyRelatedField(read_only=True)
     
     class Meta:
         model = Acknowledgment
@@ -126,9 +214,48 @@ class DashboardMetricsSerializer(serializers.Serializer):
     route_breakdown = serializers.DictField(required=False)
 
 
+class RouteTrackingSerializer(serializers.ModelSerializer):
+    """Route tracking serializer"""
+    class Meta:
+        model = RouteTracking
+        fields = [
+            'id', 'session', 'employee_id', 'latitude', 'longitude',
+            'timestamp', 'date', 'accuracy', 'speed', 'event_type',
+            'shipment_id', 'fuel_efficiency', 'fuel_price',
+        ]
+        read_only_fields = ['id', 'date']
+        list_serializer_class = CachedListSerializer
+
+    _VALUE_FIELDS = (
+        'id', 'session_id', 'employee_id', 'latitude', 'longitude',
+        'timestamp', 'date', 'accuracy', 'speed', 'event_type',
+        'shipment_id', 'fuel_efficiency', 'fuel_price',
+    )
+
+    @classmethod
+    def to_list(cls, queryset):
+        """
+        Render a tracking queryset straight from values() rows, skipping model
+        construction. Output matches RouteTrackingSerializer(many=True).data.
+        """
+        timestamp_field = serializers.DateTimeField()
+        date_field = serializers.DateField()
+        rows = list(queryset.values(*cls._VALUE_FIELDS))
+        for row in rows:
+            row['session'] = row.pop('session_id')
+            if row['timestamp'] is not None:
+                row['timestamp'] = timestamp_field.to_representation(row['timestamp'])
+            if row['date'] is not None:
+                row['date'] = date_field.to_representation(row['date'])
+        return rows
+
+
 class RouteSessionSerializer(serializers.ModelSerializer):
     """Route session serializer"""
-    tracking_points = serializers.SerializerMethodField()
+    # Limit to 100 points; list views prefetch these into _prefetched_points
+    TRACKING_POINTS_LIMIT = 100
+
+    tracking_points = RouteTrackingSerializer(many=True, read_only=True, source='_prefetched_points')
     
     class Meta:
         model = RouteSession
@@ -143,22 +270,31 @@ class RouteSessionSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
     
-    def get_tracking_points(self, obj):
-        """Get tracking points for this session"""
-        points = obj.tracking_points.all()[:100]  # Limit to 100 points
-        return RouteTrackingSerializer(points, many=True).data
-
-
-class RouteTrackingSerializer(serializers.ModelSerializer):
-    """Route tracking serializer"""
-    class Meta:
-        model = RouteTracking
-        fields = [
-            'id', 'session', 'employee_id', 'latitude', 'longitude',
-            'timestamp', 'date', 'accuracy', 'speed', 'event_type',
-            'shipment_id', 'fuel_efficiency', 'fuel_price',
-        ]
-        read_only_fields = ['id', 'date']
+    @classmethod
+    def tracking_points_prefetch(cls):
+        """Prefetch for the first TRACKING_POINTS_LIMIT points of each session"""
+        return Prefetch(
+            'tracking_points',
+            queryset=RouteTracking.objects.order_by('timestamp')[:cls.TRACKING_POINTS_LIMIT],
+            to_attr='_prefetched_points',
+        )
+
+    def to_representation(self, instance):
+        if hasattr(instance, '_prefetched_points'):
+            return super().to_representation(instance)
+
+        # Sessions loaded without the prefetch (create/stop responses) render
+        # their points from a values() projection instead
+        points = RouteTrackingSerializer.to_list(
+            instance.tracking_points.order_by('timestamp')[:self.TRACKING_POINTS_LIMIT]
+        )
+        instance._prefetched_points = ()
+        try:
+            data = super().to_representation(instance)
+        finally:
+            del instance._prefetched_points
+        data['tracking_points'] = points
+        return data
 
 
 class RouteSessionCreateSerializer(serializers.Serializer):
@@ -175,18 +311,98 @@ class RouteSessionStopSerializer(serializers.Serializer):
     end_longitude = serializers.FloatField()
 
 
-class CoordinateSerializer(serializers.Serializer):
-    """Serializer for GPS coordinates"""
-    session_id = serializers.CharField(required=True)
-    latitude = serializers.FloatField()
-    longitude = serializers.FloatField()
-    accuracy = serializers.FloatField(required=False, allow_null=True)
-    speed = serializers.FloatField(required=False, allow_null=True)
-    timestamp = serializers.DateTimeField(required=False)
-    
-    def validate(self, data):
-        """Normalize session_id"""
-        return data
+class CamelCaseAliasMixin:
+    """
+    Accept camelCase keys from mobile clients for the snake_case fields listed
+    in _ALIASES. Runs once per payload in to_internal_value (GPS ingest is hot).
+    """
+    _ALIASES = ()
+
+    def to_internal_value(self, data):
+        if isinstance(data, dict) and any(camel in data for _, camel in self._ALIASES):
+            if html.is_html_input(data):
+                # Form input: copy as a QueryDict so each key keeps its value list
+                data = data.copy()
+                for snake, camel in self._ALIASES:
+                    if camel in data:
+                        values = data.pop(camel)
+                        if snake not in data:
+                            data.setlist(snake, values)
+            else:
+                data = dict(data)
+                for snake, camel in self._ALIASES:
+                    if camel in data:
+                        data.setdefault(snake, data.pop(camel))
+        return super().to_internal_value(data)
+
+
+@dataclass(slots=True, frozen=True)
+class Coordinate:
+    """Validated GPS ping (see parse_coordinate)"""
+    session_id: str
+    latitude: float
+    longitude: float
+    accuracy: float | None = None
+    speed: float | None = None
+    timestamp: datetime | None = None
+
+
+def _coerce_float(raw, key, errors, required=False):
+    value = raw.get(key)
+    if value is None or value == '':
+        if required:
+            errors[key] = ['This field is required.']
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        errors[key] = ['A valid number is required.']
+        return None
+    if not math.isfinite(value):
+        errors[key] = ['A valid number is required.']
+        return None
+    return value
+
+
+def parse_coordinate(raw):
+    """
+    Validate a single GPS ping: session_id (or sessionId), latitude and
+    longitude are required; accuracy, speed and timestamp are optional.
+    Raises a field-keyed ValidationError like a serializer would; plain code
+    instead of a Serializer because this runs for every ping a rider sends.
+    """
+    if not isinstance(raw, dict):
+        raise serializers.ValidationError({'non_field_errors': ['Invalid data. Expected a dictionary.']})
+
+    errors = {}
+    session_id = raw.get('session_id') or raw.get('sessionId')
+    session_id = str(session_id).strip() if session_id is not None else ''
+    if not session_id:
+        errors['session_id'] = ['This field is required.']
+
+    latitude = _coerce_float(raw, 'latitude', errors, required=True)
+    longitude = _coerce_float(raw, 'longitude', errors, required=True)
+    accuracy = _coerce_float(raw, 'accuracy', errors)
+    speed = _coerce_float(raw, 'speed', errors)
+
+    timestamp = raw.get('timestamp')
+    if timestamp:
+        if not isinstance(timestamp, datetime):
+            try:
+                timestamp = parse_datetime(str(timestamp))
+            except ValueError:
+                timestamp = None
+            if timestamp is None:
+                errors['timestamp'] = ['Datetime has wrong format.']
+        if timestamp is not None and timezone.is_naive(timestamp):
+            timestamp = timezone.make_aware(timestamp)
+    else:
+        timestamp = None
+
+    if errors:
+        raise serializers.ValidationError(errors)
+
+    return Coordinate(session_id, latitude, longitude, accuracy, speed, timestamp)
 
 
 class RouteLocationSerializer(serializers.Serializer):
@@ -200,8 +416,13 @@ class RouteLocationSerializer(serializers.Serializer):
         return data
 
 
-class RouteOptimizeRequestSerializer(serializers.Serializer):
+class RouteOptimizeRequestSerializer(CamelCaseAliasMixin, serializers.Serializer):
     """Serializer for route optimization request"""
+    _ALIASES = (
+        ('current_latitude', 'currentLatitude'),
+        ('current_longitude', 'currentLongitude'),
+    )
+
     current_latitude = serializers.FloatField(required=False)
     current_longitude = serializers.FloatField(required=False)
     locations = RouteLocationSerializer(many=True)
@@ -233,10 +454,42 @@ class ChangeRiderSerializer(serializers.Serializer):
     reason = serializers.CharField(required=False, allow_blank=True, help_text="Reason for rider change")
 
 
+class PositiveIntegerListField(serializers.ListField):
+    """
+    List of positive integer IDs cast in one pass instead of running
+    IntegerField.to_internal_value per element (dispatcher batches run to thousands).
+    The child field is kept for schema generation.
+    """
+    default_error_messages = {
+        'invalid_id': 'All IDs must be positive integers.',
+    }
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('child', serializers.IntegerField(min_value=1))
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        if html.is_html_input(data):
+            data = html.parse_html_list(data, default=[])
+        if isinstance(data, (str, dict)) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+        try:
+            ids = [int(value) for value in data]
+        except (TypeError, ValueError):
+            self.fail('invalid_id')
+        if ids and min(ids) <= 0:
+            self.fail('invalid_id')
+        # int() would silently accept True and truncate 1.5
+        if any(type(value) is bool or (type(value) is float and not value.is_integer()) for value in data):
+            self.fail('invalid_id')
+        return ids
+
+
 class BatchChangeRiderSerializer(serializers.Serializer):
     """Serializer for batch changing shipment riders"""
-    shipment_ids = serializers.ListField(
-        child=serializers.IntegerField(),
+    shipment_ids = PositiveIntegerListField(
         required=True,
         help_text="List of shipment IDs to update"
     )
@@ -253,13 +506,16 @@ class ShipmentEventSerializer(serializers.Serializer):
     longitude = serializers.FloatField()
 
 
-class BulkShipmentEventSerializer(serializers.Serializer):
+class BulkShipmentEventSerializer(CamelCaseAliasMixin, serializers.Serializer):
     """Serializer for bulk shipment events at one location"""
+    _ALIASES = (
+        ('session_id', 'sessionId'),
+        ('shipment_ids', 'shipmentIds'),
+        ('event_type', 'eventType'),
+    )
+
     session_id = serializers.CharField(required=True)
     shipment_ids = serializers.ListField(child=serializers.CharField(), required=True)
     event_type = serializers.ChoiceField(choices=['pickup', 'delivery'], required=True)
     latitude = serializers.FloatField()
     longitude = serializers.FloatField()
-
-    def validate(self, data):
-        return data
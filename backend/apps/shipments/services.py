@@ -3,13 +3,158 @@ Shipment services for RiderPro
 Includes centralized status change management with event emission
 """
 import logging
-from typing import Optional, Dict, Any
+import math
+import os
+import queue
+import random
+import threading
+import time
+from typing import Optional, Dict, Any, List, Union
+from urllib.parse import urlencode
+from django.core.cache import cache
+from django.db import DatabaseError, connection, connections, transaction
+from django.db.models import Exists, F, OuterRef, Q, QuerySet
 from django.utils import timezone
 from django.conf import settings
 from .models import Shipment, OrderEvent, RouteSession, RouteTracking
 
 logger = logging.getLogger(__name__)
 
+# GPS ingest resolves the rider's active session on every fix; cache the id.
+# The default cache is per process, so a cached id is only a hint: the
+# current-location UPDATE re-checks it on every write (see
+# LocationTrackingService._record_current_location).
+ACTIVE_SESSION_CACHE_TTL = 60
+
+
+def active_session_cache_key(employee_id: str) -> str:
+    return f"active_session:{employee_id}"
+
+
+# Live rider positions are polled by every open dashboard; serve them from a
+# short-lived cache entry. With the default per-process cache a write could only
+# invalidate its own worker, so freshness comes from the TTL alone.
+ACTIVE_RIDERS_CACHE_TTL = 3
+ACTIVE_RIDERS_CACHE_KEY = 'active_riders_locations'
+
+# Dashboard drop points: shipments a rider still has to deliver or collect
+ACTIVE_DROP_STATUSES = ['Assigned', 'Collected', 'In Transit', 'Picked Up']
+# Keep each rider's live path bounded for real-time polling
+ACTIVE_RIDER_ROUTE_POINTS_LIMIT = 300
+
+
+def resolve_employee_name_map(employee_ids) -> Dict[str, str]:
+    """
+    Resolve display names for employee IDs from rider/user tables.
+    Employee IDs without a display name are left out.
+    """
+    if not employee_ids:
+        return {}
+
+    employee_names = {}
+    try:
+        from apps.authentication.models import RiderAccount, User
+
+        riders = RiderAccount.objects.filter(
+            rider_id__in=employee_ids
+        ).values('rider_id', 'name')
+        for rider in riders:
+            if rider.get('name'):
+                employee_names[rider['rider_id']] = rider['name']
+
+        users = User.objects.filter(
+            employee_id__in=employee_ids
+        ).values('employee_id', 'full_name', 'first_name', 'last_name', 'username')
+        for user in users:
+            employee_id = user.get('employee_id')
+            if not employee_id or employee_id in employee_names:
+                continue
+
+            full_name = (
+                user.get('full_name')
+                or f"{user.get('first_name', '').strip()} {user.get('last_name', '').strip()}".strip()
+                or user.get('username')
+            )
+            if full_name:
+                employee_names[employee_id] = full_name
+    except Exception as exc:
+        logger.warning("Failed resolving employee display names: %s", exc)
+
+    return employee_names
+
+
+# Columns a status change writes (updated_at listed explicitly: auto_now only
+# applies to fields included in update_fields)
+STATUS_UPDATE_FIELDS = ['status', 'synced_to_external', 'sync_status', 'updated_at']
+
+# POPS sync bookkeeping columns; saves limited to these never notify partners
+SYNC_BOOKKEEPING_FIELDS = frozenset({
+    'synced_to_external', 'sync_status', 'sync_attempts', 'last_sync_attempt', 'sync_error', 'updated_at'
+})
+
+# A repeated transition (re-marking a shipment Delivered, retried bulk
+# actions) would PATCH POPS with the payload it just accepted; remember the
+# last synced (status, rider) per order briefly and skip the duplicate call.
+POPS_SYNC_DEDUP_TTL = 10
+
+
+def pops_sync_cache_key(pops_order_id) -> str:
+    return f"pops_synced:{pops_order_id}"
+
+# Seconds before each retry of a failed background POPS sync (jittered); a
+# sync still failing after the last retry stays sync_status='failed'
+POPS_SYNC_RETRY_DELAYS = (5, 30, 120)
+
+
+# Background POPS syncs share a few daemon threads per process. A large batch,
+# or POPS being down while retries sleep, can't pile up one thread per row.
+# Syncs still queued when the worker exits are lost; those shipments stay
+# 'pending'/'failed' for the sync endpoints.
+POPS_SYNC_WORKERS = 4
+
+
+def _wait_for_retry(delay: float) -> None:
+    """Sleep before a background retry without holding this thread's DB connection"""
+    connections.close_all()
+    time.sleep(delay * random.uniform(0.5, 1.5))
+
+
+class _BackgroundWorkers:
+    """
+    A fixed number of daemon threads draining one job queue. The threads are
+    started on first use in each process (they don't survive a fork).
+    """
+
+    def __init__(self, size: int, name: str):
+        self._size = size
+        self._name = name
+        self._jobs = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def submit(self, fn, *args) -> None:
+        with self._lock:
+            if self._pid != os.getpid():
+                for index in range(self._size):
+                    threading.Thread(
+                        target=self._work, name=f"{self._name}-{index}", daemon=True
+                    ).start()
+                self._pid = os.getpid()
+        self._jobs.put((fn, args))
+
+    def _work(self) -> None:
+        while True:
+            fn, args = self._jobs.get()
+            try:
+                fn(*args)
+            except Exception as e:
+                logger.error("Background %s job failed: %s", self._name, e, exc_info=True)
+            finally:
+                connections.close_all()
+
+
+_pops_sync_workers = _BackgroundWorkers(POPS_SYNC_WORKERS, 'pops-sync')
+
 
 class ShipmentStatusService:
     """
@@ -50,29 +195,195 @@ class ShipmentStatusService:
         shipment.synced_to_external = False
         shipment.sync_status = 'pending'
         shipment._suppress_callback = not sync_to_pops
-        shipment.save()
-        
-        # Create event
-        event = OrderEvent.objects.create(
-            shipment=shipment,
-            event_type='status_change',
-            old_status=old_status,
-            new_status=new_status,
-            triggered_by=triggered_by or 'system',
-            metadata=metadata or {}
-        )
+        with transaction.atomic():
+            shipment.save(update_fields=STATUS_UPDATE_FIELDS)
+            
+            # Create event
+            event = OrderEvent.objects.create(
+                shipment=shipment,
+                event_type='status_change',
+                old_status=old_status,
+                new_status=new_status,
+                triggered_by=triggered_by or 'system',
+                metadata=metadata or {}
+            )
         
         logger.info(
-            f"Status updated: Shipment {shipment.id} from '{old_status}' to '{new_status}' "
-            f"(Event {event.id}, triggered by {triggered_by or 'system'})"
+            "Status updated: Shipment %s from '%s' to '%s' (Event %s, triggered by %s)",
+            shipment.id, old_status, new_status, event.id, triggered_by or 'system'
         )
         
         # Sync to POPS if requested
         if sync_to_pops and shipment.pops_order_id:
-            ShipmentStatusService._sync_to_pops(shipment, event, new_status)
+            ShipmentStatusService.queue_syncs_to_pops([(shipment.id, event.id, new_status)])
         
         return shipment, event
     
+    @staticmethod
+    def update_status_bulk(
+        shipments: List[Shipment],
+        new_status: str,
+        triggered_by: Optional[str] = None,
+        metadata: Optional[Dict[str, Any]] = None,
+        sync_to_pops: bool = True
+    ) -> List[OrderEvent]:
+        """
+        Move several shipments to the same status with one bulk UPDATE and one
+        bulk INSERT of their events. bulk_update skips model signals, so the
+        status callbacks post_save would send are queued explicitly.
+        
+        Returns:
+            The created events, in the same order as shipments
+        """
+        if not shipments:
+            return []
+        
+        old_statuses = {}
+        for shipment in shipments:
+            old_statuses[shipment.id] = shipment.status
+            shipment.status = new_status
+            shipment.synced_to_external = False
+            shipment.sync_status = 'pending'
+            shipment._suppress_callback = not sync_to_pops
+        
+        now = timezone.now()
+        with transaction.atomic():
+            for shipment in shipments:
+                shipment.updated_at = now
+            Shipment.objects.bulk_update(shipments, STATUS_UPDATE_FIELDS, batch_size=500)
+            events = OrderEvent.objects.bulk_create([
+                OrderEvent(
+                    shipment=shipment,
+                    event_type='status_change',
+                    old_status=old_statuses[shipment.id],
+                    new_status=new_status,
+                    triggered_by=triggered_by or 'system',
+                    metadata=metadata or {}
+                )
+                for shipment in shipments
+            ], batch_size=500)
+        
+        from .signals import queue_status_change_callbacks
+        queue_status_change_callbacks(shipments, old_statuses)
+        
+        logger.info(
+            "Status updated: %d shipments to '%s' (triggered by %s)",
+            len(shipments), new_status, triggered_by or 'system'
+        )
+        
+        if sync_to_pops:
+            ShipmentStatusService.queue_syncs_to_pops([
+                (shipment.id, event.id, new_status)
+                for shipment, event in zip(shipments, events)
+                if shipment.pops_order_id
+            ])
+        
+        return events
+    
+    @staticmethod
+    def queue_syncs_to_pops(syncs: List[tuple]) -> None:
+        """
+        Sync status changes, given as (shipment_id, event_id, status), to POPS
+        after the transaction commits, as one job on the background POPS
+        workers so the request doesn't wait on the POPS round trip. Failures are
+        retried with backoff, then recorded on the shipment (sync_status='failed');
+        shipments left 'pending' are picked up by the sync endpoints.
+        """
+        if syncs:
+            transaction.on_commit(
+                lambda: _pops_sync_workers.submit(ShipmentStatusService._run_syncs_to_pops, syncs)
+            )
+    
+    @staticmethod
+    def queue_fields_syncs_to_pops(syncs: List[tuple]) -> None:
+        """
+        Push shipments' mutable fields (status, rider, route, remarks,
+        acknowledgement artifacts), given as (shipment_id, pops_order_id,
+        payload, access_token), to POPS after the transaction commits, as one
+        job on the background POPS workers. The outcome is recorded on each
+        shipment; failed ones are retried by the sync endpoints.
+        """
+        def _run():
+            for sync in syncs:
+                ShipmentStatusService._sync_fields_to_pops(*sync)
+
+        if syncs:
+            transaction.on_commit(lambda: _pops_sync_workers.submit(_run))
+    
+    @staticmethod
+    def _sync_fields_to_pops(
+        shipment_id: int,
+        pops_order_id: int,
+        payload: Dict[str, Any],
+        access_token: str
+    ) -> bool:
+        """
+        PATCH the POPS order and record the result with queryset UPDATEs
+        
+        Returns:
+            True if sync successful, False otherwise
+        """
+        from utils.pops_client import pops_client
+        
+        try:
+            result = pops_client.update_order_fields(pops_order_id, payload, access_token)
+            if result is None:
+                raise ValueError("POPS sync returned empty response")
+        except Exception as e:
+            logger.error("Failed POPS sync for shipment %s: %s", shipment_id, e, exc_info=True)
+            now = timezone.now()
+            Shipment.objects.filter(pk=shipment_id).update(
+                synced_to_external=False, sync_status='failed', sync_error=str(e),
+                sync_attempts=F('sync_attempts') + 1, last_sync_attempt=now, updated_at=now
+            )
+            return False
+        
+        now = timezone.now()
+        Shipment.objects.filter(pk=shipment_id).update(
+            synced_to_external=True, sync_status='synced', sync_error='',
+            sync_attempts=0, last_sync_attempt=now, updated_at=now
+        )
+        return True
+    
+    @staticmethod
+    def _run_syncs_to_pops(syncs: List[tuple]) -> List[tuple]:
+        """
+        Sync with retries. Each round retries only the syncs that failed in the
+        previous one, so a batch waits out one backoff rather than one per
+        shipment. Returns the syncs still failing after the last retry.
+        """
+        pending = list(syncs)
+        for delay in (0,) + POPS_SYNC_RETRY_DELAYS:
+            if not pending:
+                break
+            if delay:
+                _wait_for_retry(delay)
+            pending = [sync for sync in pending if not ShipmentStatusService._attempt_sync_to_pops(*sync)]
+        return pending
+    
+    @staticmethod
+    def _attempt_sync_to_pops(shipment_id: int, event_id: int, status: str) -> bool:
+        """
+        One sync attempt; False means retry. Every attempt re-reads the shipment
+        and gives up once a newer status has replaced this one, so a late retry
+        can't roll POPS back.
+        """
+        try:
+            shipment = Shipment.objects.get(id=shipment_id)
+            event = OrderEvent.objects.get(id=event_id)
+        except (Shipment.DoesNotExist, OrderEvent.DoesNotExist):
+            logger.warning(
+                "Skipping POPS sync: shipment %s or event %s no longer exists", shipment_id, event_id
+            )
+            return True
+        if shipment.status != status:
+            logger.info(
+                "Skipping POPS sync of '%s' for shipment %s: status is now '%s'",
+                status, shipment_id, shipment.status
+            )
+            return True
+        return ShipmentStatusService._sync_to_pops(shipment, event, status)
+    
     @staticmethod
     def _sync_to_pops(shipment: Shipment, event: OrderEvent, status: str) -> bool:
         """
@@ -93,7 +404,7 @@ class ShipmentStatusService:
             if not pops_access_token:
                 logger.warning("POPS service account credentials or token not configured. Cannot sync to POPS.")
                 event.sync_error = "POPS service token not configured"
-                event.save()
+                OrderEvent.objects.filter(pk=event.pk).update(sync_error=event.sync_error)
                 return False
             
             # Sync via the canonical field-update path: PATCH /deliveryq/{id}/.
@@ -104,43 +415,62 @@ class ShipmentStatusService:
             # lifetime); the dead status-update fallback was removed since no
             # RiderPro service account has write access to that endpoint.
             # (Still needs POPS-side write permission on the PATCH endpoint.)
-            sync_response = pops_client.update_order_fields(
-                shipment.pops_order_id,
-                {
-                    'status': status,
-                    'assigned_to': shipment.employee_id,
-                },
-                pops_access_token
-            )
-            if sync_response is None:
-                raise ValueError("POPS status update failed")
+            dedup_key = pops_sync_cache_key(shipment.pops_order_id)
+            synced_state = (status, shipment.employee_id)
+            if cache.get(dedup_key) == synced_state:
+                logger.info("POPS already has status %s for shipment %s, skipping sync", status, shipment.id)
+            else:
+                sync_response = pops_client.update_order_fields(
+                    shipment.pops_order_id,
+                    {
+                        'status': status,
+                        'assigned_to': shipment.employee_id,
+                    },
+                    pops_access_token
+                )
+                if sync_response is None:
+                    cache.delete(dedup_key)
+                    # The token may have expired since it was last verified
+                    pops_client.recheck_service_token()
+                    raise ValueError("POPS status update failed")
+                cache.set(dedup_key, synced_state, POPS_SYNC_DEDUP_TTL)
             
             # Mark as synced
+            now = timezone.now()
             shipment.synced_to_external = True
             shipment.sync_status = 'synced'
             shipment.sync_attempts = 0
-            shipment.last_sync_attempt = timezone.now()
-            shipment.save()
-            
+            shipment.last_sync_attempt = now
             event.synced_to_pops = True
-            event.sync_attempted_at = timezone.now()
-            event.save()
+            event.sync_attempted_at = now
+            # Bookkeeping only: skip the save signals (status-change lookup,
+            # partner callback check) with queryset UPDATEs
+            with transaction.atomic():
+                Shipment.objects.filter(pk=shipment.pk).update(
+                    synced_to_external=True, sync_status='synced', sync_attempts=0,
+                    last_sync_attempt=now, updated_at=now
+                )
+                OrderEvent.objects.filter(pk=event.pk).update(synced_to_pops=True, sync_attempted_at=now)
             
-            logger.info(f"Successfully synced shipment {shipment.id} status to POPS")
+            logger.info("Successfully synced shipment %s status to POPS", shipment.id)
             return True
             
         except Exception as e:
-            logger.error(f"Failed to sync shipment {shipment.id} to POPS: {e}", exc_info=True)
+            logger.error("Failed to sync shipment %s to POPS: %s", shipment.id, e, exc_info=True)
             
+            now = timezone.now()
             shipment.sync_status = 'failed'
             shipment.sync_attempts += 1
             shipment.sync_error = str(e)
-            shipment.last_sync_attempt = timezone.now()
-            shipment.save()
-            
+            shipment.last_sync_attempt = now
             event.sync_error = str(e)
-            event.sync_attempted_at = timezone.now()
-            event.save()
+            event.sync_attempted_at = now
+            with transaction.atomic():
+                Shipment.objects.filter(pk=shipment.pk).update(
+                    sync_status='failed', sync_attempts=F('sync_attempts') + 1, sync_error=str(e),
+                    last_sync_attempt=now, updated_at=now
+                )
+                OrderEvent.objects.filter(pk=event.pk).update(sync_error=str(e), sync_attempted_at=now)
             
             return False
     
@@ -170,7 +500,7 @@ class ShipmentStatusService:
             triggered_by=triggered_by or 'system'
         )
         
-        logger.info(f"Event created: {event_type} for shipment {shipment.id} (Event {event.id})")
+        logger.info("Event created: %s for shipment %s (Event %s)", event_type, shipment.id, event.id)
         return event
 
 
@@ -179,9 +509,19 @@ class RoutePlanningService:
     Service for route planning and Google Maps integration
     """
     
+    @staticmethod
+    def _extract_coords(shipments):
+        """
+        Rows exposing latitude/longitude/pickup_address; a queryset is read
+        as a named values_list so only those columns are fetched
+        """
+        if isinstance(shipments, QuerySet):
+            return shipments.values_list('id', 'latitude', 'longitude', 'pickup_address', named=True)
+        return shipments
+    
     @staticmethod
     def generate_google_maps_url(
-        shipments: list[Shipment],
+        shipments: Union[list[Shipment], QuerySet],
         start_location: Optional[tuple[float, float]] = None,
         optimize: bool = True
     ) -> str:
@@ -189,82 +529,146 @@ class RoutePlanningService:
         Generate Google Maps deep link URL for Android navigation
         
         Args:
-            shipments: List of shipments to include in route
+            shipments: Shipments (or a Shipment queryset) to include in route
             start_location: Optional start location (lat, lng). If not provided, uses first shipment pickup
             optimize: Whether to optimize route order
         
         Returns:
             Google Maps deep link URL
         """
-        if not shipments:
-            return ""
-        
-        # Filter shipments with valid coordinates
-        valid_shipments = [
-            s for s in shipments
-            if s.latitude and s.longitude
-        ]
+        # One pass: keep shipments with valid coordinates as waypoints (all
+        # delivery locations), remembering the first one
+        first = None
+        waypoints = []
+        for s in RoutePlanningService._extract_coords(shipments):
+            if s.latitude and s.longitude:
+                if first is None:
+                    first = s
+                waypoints.append(f"{s.latitude},{s.longitude}")
         
-        if not valid_shipments:
+        if first is None:
             return ""
         
+        first_lat, first_lng = first.latitude, first.longitude
+        
         # Determine start location
         # Priority: 1) Provided start_location, 2) First shipment's pickup_address coordinates, 3) First shipment's delivery coordinates
         if start_location:
             start_lat, start_lng = start_location
-        elif valid_shipments[0].pickup_address:
-            # Try to extract from pickup address JSON
-            pickup = valid_shipments[0].pickup_address
-            if isinstance(pickup, dict):
-                # Check if coordinates are directly in pickup address
-                start_lat = pickup.get('latitude') or pickup.get('lat')
-                start_lng = pickup.get('longitude') or pickup.get('lng') or pickup.get('lon')
-                # If not in pickup, use first shipment's delivery coordinates
-                if not start_lat or not start_lng:
-                    start_lat, start_lng = valid_shipments[0].latitude, valid_shipments[0].longitude
-            else:
-                # Pickup address is not a dict, use delivery coordinates
-                start_lat, start_lng = valid_shipments[0].latitude, valid_shipments[0].longitude
         else:
-            # No pickup address, use first shipment's delivery coordinates as start
-            start_lat, start_lng = valid_shipments[0].latitude, valid_shipments[0].longitude
-        
-        # Build waypoints (all delivery locations)
-        waypoints = [
-            f"{s.latitude},{s.longitude}"
-            for s in valid_shipments
-        ]
+            start_lat, start_lng = first_lat, first_lng
+            pickup = first.pickup_address
+            if isinstance(pickup, dict):
+                # Use coordinates directly in the pickup address when both are present
+                pickup_lat = pickup.get('latitude') or pickup.get('lat')
+                pickup_lng = pickup.get('longitude') or pickup.get('lng') or pickup.get('lon')
+                if pickup_lat and pickup_lng:
+                    start_lat, start_lng = pickup_lat, pickup_lng
         
         # If we have a start location different from first waypoint, add it
-        if start_location and (abs(start_lat - valid_shipments[0].latitude) > 0.001 or 
-                               abs(start_lng - valid_shipments[0].longitude) > 0.001):
+        if start_location and (abs(start_lat - first_lat) > 0.001 or
+                               abs(start_lng - first_lng) > 0.001):
             # Use first shipment as destination, others as waypoints
             destination = waypoints[0]
-            waypoints = waypoints[1:] if len(waypoints) > 1 else []
+            waypoints = waypoints[1:]
         else:
             # Last shipment is destination
             destination = waypoints[-1]
-            waypoints = waypoints[:-1] if len(waypoints) > 1 else []
+            waypoints = waypoints[:-1]
         
         # Build Google Maps URL
         # Format: https://www.google.com/maps/dir/?api=1&origin=lat,lng&destination=lat,lng&waypoints=lat1,lng1|lat2,lng2
-        url = f"https://www.google.com/maps/dir/?api=1"
-        url += f"&origin={start_lat},{start_lng}"
-        url += f"&destination={destination}"
+        params = [('api', '1'), ('origin', f"{start_lat},{start_lng}"), ('destination', destination)]
         
         if waypoints:
-            url += f"&waypoints={'|'.join(waypoints)}"
+            params.append(('waypoints', '|'.join(waypoints)))
         
         if optimize:
-            url += "&dir_action=navigate"  # Opens in navigation mode on Android
+            params.append(('dir_action', 'navigate'))  # Opens in navigation mode on Android
         
-        return url
+        return "https://www.google.com/maps/dir/?" + urlencode(params, safe='|,')
     
 class LocationTrackingService:
     """
     Service for tracking user/rider locations in real-time
     """
     
+    @staticmethod
+    def _record_current_location(user_id: str, session_id: Optional[str],
+                                 latitude: float, longitude: float, now) -> Optional[str]:
+        """
+        Move the session a location update belongs to onto the given position
+        and return its id, or None when the rider has no such session. Without
+        a session_id the rider's newest active session is used, auto-created
+        when none is active.
+
+        The UPDATE doubles as the session check: a session stopped, superseded
+        or deleted through another worker matches no row, so a stale cached id
+        is dropped and resolved again instead of being written to.
+        """
+        position = {'current_latitude': latitude, 'current_longitude': longitude, 'last_updated': now}
+        if session_id:
+            if RouteSession.objects.filter(id=session_id, employee_id=user_id).update(**position):
+                return session_id
+            logger.warning(f"Session {session_id} not found for {user_id}")
+            return None
+
+        active_key = active_session_cache_key(user_id)
+        session_id = cache.get(active_key)
+        if session_id is not None:
+            newer_session = RouteSession.objects.filter(
+                employee_id=user_id, status='active', start_time__gt=OuterRef('start_time')
+            )
+            if RouteSession.objects.filter(
+                id=session_id, employee_id=user_id, status='active'
+            ).exclude(Exists(newer_session)).update(**position):
+                return session_id
+            cache.delete(active_key)
+
+        session_id = LocationTrackingService._get_or_create_active_session_id(
+            user_id, latitude, longitude
+        )
+        cache.set(active_key, session_id, ACTIVE_SESSION_CACHE_TTL)
+        RouteSession.objects.filter(id=session_id).update(**position)
+        return session_id
+
+    @staticmethod
+    def _get_or_create_active_session_id(user_id: str, latitude: float, longitude: float) -> str:
+        """
+        Return the rider's active session id, creating one if none is active.
+        Concurrent trackers for the same rider are serialized on a transaction
+        advisory lock so they can't each auto-create a session. A unique
+        constraint isn't possible: /routes/start opens a new active session
+        without closing the previous one.
+        """
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", [f"route_session:{user_id}"])
+
+            session_id = RouteSession.objects.filter(
+                employee_id=user_id,
+                status='active'
+            ).order_by('-start_time').values_list('id', flat=True).first()
+            if session_id:
+                return session_id
+
+            # Create new session automatically
+            now = timezone.now()
+            session_id = f'sess-{int(now.timestamp() * 1000)}-{user_id}'
+            RouteSession.objects.create(
+                id=session_id,
+                employee_id=user_id,
+                start_latitude=latitude,
+                start_longitude=longitude,
+                start_time=now,
+                status='active',
+                current_latitude=latitude,
+                current_longitude=longitude,
+                last_updated=now
+            )
+        logger.info(f"Auto-created route session {session_id} for location tracking")
+        return session_id
+
     @staticmethod
     def track_location(user_id: str, latitude: float, longitude: float, 
                       accuracy: Optional[float] = None, speed: Optional[float] = None,
@@ -272,67 +676,54 @@ class LocationTrackingService:
         """
         Track user location and update session cache
         """
+        created = LocationTrackingService.track_location_bulk(
+            user_id,
+            [{'latitude': latitude, 'longitude': longitude, 'accuracy': accuracy, 'speed': speed}],
+            session_id=session_id
+        )
+        return created[0] if created else None
+
+    @staticmethod
+    def track_location_bulk(user_id: str, points: list,
+                            session_id: Optional[str] = None) -> list:
+        """
+        Track a batch of locations for one rider with a single session lookup
+        and one bulk INSERT. Each point is a dict with latitude/longitude and
+        optional accuracy, speed and timestamp; points are expected in
+        chronological order, the last one becomes the session's current location.
+        Returns the created RouteTracking rows (empty on failure).
+        """
+        if not points:
+            return []
+
         try:
-            # Get or create active session if session_id not provided
-            if not session_id:
-                active_session = RouteSession.objects.filter(
-                    employee_id=user_id,
-                    status='active'
-                ).order_by('-start_time').first()
-                
-                if active_session:
-                    session_id = active_session.id
-                else:
-                    # Create new session automatically
-                    session_id = f'sess-{int(timezone.now().timestamp() * 1000)}-{user_id}'
-                    active_session = RouteSession.objects.create(
-                        id=session_id,
-                        employee_id=user_id,
-                        start_latitude=latitude,
-                        start_longitude=longitude,
-                        start_time=timezone.now(),
-                        status='active',
-                        current_latitude=latitude,
-                        current_longitude=longitude,
-                        last_updated=timezone.now()
-                    )
-                    logger.info(f"Auto-created route session {session_id} for location tracking")
-            
-            # Get session
-            try:
-                session = RouteSession.objects.get(id=session_id)
-                # Verify ownership if needed, but for now trust the ID if found
-                if session.employee_id != user_id:
-                    logger.warning(f"Session {session_id} belongs to {session.employee_id}, not {user_id}")
-                    return None
-            except RouteSession.DoesNotExist:
-                logger.warning(f"Session {session_id} not found")
-                return None
-            
-            # Create tracking point
-            from .models import RouteTracking  # Ensure import is available
-            tracking = RouteTracking.objects.create(
-                session=session,
-                employee_id=user_id,
-                latitude=latitude,
-                longitude=longitude,
-                timestamp=timezone.now(),
-                accuracy=accuracy,
-                speed=speed,
-                event_type='gps'
+            now = timezone.now()
+            last = points[-1]
+            session_id = LocationTrackingService._record_current_location(
+                user_id, session_id, last['latitude'], last['longitude'], now
             )
+            if session_id is None:
+                return []
+
+            created = RouteTracking.objects.bulk_create([
+                RouteTracking(
+                    session_id=session_id,
+                    employee_id=user_id,
+                    latitude=point['latitude'],
+                    longitude=point['longitude'],
+                    timestamp=point.get('timestamp') or now,
+                    accuracy=point.get('accuracy'),
+                    speed=point.get('speed'),
+                    event_type='gps'
+                )
+                for point in points
+            ], batch_size=1000)
             
-            # Update session current location cache
-            session.current_latitude = latitude
-            session.current_longitude = longitude
-            session.last_updated = timezone.now()
-            session.save(update_fields=['current_latitude', 'current_longitude', 'last_updated'])
-            
-            return tracking
+            return created
             
-        except Exception as e:
-            logger.error(f"Failed to track location: {e}", exc_info=True)
-            return None
+        except DatabaseError as e:
+            logger.error(f"Failed to track location: {e}")
+            return []
     
     @staticmethod
     def get_user_current_location(user_id: str) -> Optional[Dict[str, Any]]:
@@ -344,71 +735,131 @@ class LocationTrackingService:
             active_session = RouteSession.objects.filter(
                 employee_id=user_id,
                 status='active'
-            ).order_by('-start_time').first()
+            ).order_by('-start_time').values(
+                'id', 'current_latitude', 'current_longitude', 'last_updated'
+            ).first()
             
-            if active_session and active_session.current_latitude and active_session.current_longitude:
+            if active_session and active_session['current_latitude'] and active_session['current_longitude']:
+                last_updated = active_session['last_updated']
                 return {
-                    'latitude': active_session.current_latitude,
-                    'longitude': active_session.current_longitude,
-                    'timestamp': active_session.last_updated.isoformat() if active_session.last_updated else timezone.now().isoformat(),
+                    'latitude': active_session['current_latitude'],
+                    'longitude': active_session['current_longitude'],
+                    'timestamp': last_updated.isoformat() if last_updated else timezone.now().isoformat(),
                     'accuracy': None, # Session cache doesn't store these
                     'speed': None,
-                    'session_id': active_session.id
+                    'session_id': active_session['id']
                 }
             
             # Fallback to latest tracking point
-            from .models import RouteTracking
             latest_tracking = RouteTracking.objects.filter(
                 employee_id=user_id
-            ).order_by('-timestamp').first()
+            ).order_by('-timestamp').values(
+                'latitude', 'longitude', 'timestamp', 'accuracy', 'speed', 'session_id'
+            ).first()
             
             if latest_tracking:
-                return {
-                    'latitude': latest_tracking.latitude,
-                    'longitude': latest_tracking.longitude,
-                    'timestamp': latest_tracking.timestamp.isoformat(),
-                    'accuracy': latest_tracking.accuracy,
-                    'speed': latest_tracking.speed,
-                    'session_id': latest_tracking.session_id
-                }
+                latest_tracking['timestamp'] = latest_tracking['timestamp'].isoformat()
+                return latest_tracking
             
             return None
             
-        except Exception as e:
+        except DatabaseError as e:
             logger.error(f"Failed to get user location: {e}")
             return None
     
     @staticmethod
     def get_active_riders_locations() -> list:
         """
-        Get locations of all active riders
+        Get every active rider with position, live path and open drop points,
+        as served to the live dashboard (cached for ACTIVE_RIDERS_CACHE_TTL seconds)
         """
+        return cache.get_or_set(
+            ACTIVE_RIDERS_CACHE_KEY,
+            LocationTrackingService._load_active_riders_locations,
+            ACTIVE_RIDERS_CACHE_TTL
+        )
+
+    @staticmethod
+    def _load_active_riders_locations() -> list:
         try:
-            # Get all active route sessions with location data
-            # Optimized to avoid N+1 queries by using the cached fields
-            active_sessions = RouteSession.objects.filter(
+            active_sessions = list(RouteSession.objects.filter(
                 status='active',
                 current_latitude__isnull=False,
-                current_longitude__isnull=False
+                current_longitude__isnull=False,
             ).values(
-                'employee_id', 'current_latitude', 'current_longitude', 
-                'last_updated', 'id', 'start_time'
-            )
-            
-            locations = []
+                'id', 'employee_id', 'current_latitude', 'current_longitude',
+                'last_updated', 'start_time'
+            ))
+            if not active_sessions:
+                return []
+
+            employee_ids = [session['employee_id'] for session in active_sessions if session['employee_id']]
+            employee_name_map = resolve_employee_name_map(employee_ids)
+
+            route_points_by_session = {}
+            for point in RouteTracking.objects.filter(
+                session_id__in=[session['id'] for session in active_sessions]
+            ).values(
+                'session_id', 'latitude', 'longitude', 'timestamp', 'event_type', 'shipment_id'
+            ).order_by('timestamp'):
+                route_points_by_session.setdefault(point['session_id'], []).append({
+                    'lat': point['latitude'],
+                    'lng': point['longitude'],
+                    'timestamp': point['timestamp'].isoformat() if point['timestamp'] else None,
+                    'event_type': point['event_type'],
+                    'shipment_id': point['shipment_id'],
+                })
+
+            drop_points_by_employee = {}
+            for shipment in Shipment.objects.filter(
+                employee_id__in=employee_ids,
+                status__in=ACTIVE_DROP_STATUSES,
+                latitude__isnull=False,
+                longitude__isnull=False,
+            ).values(
+                'employee_id', 'id', 'pops_order_id', 'status', 'type', 'latitude', 'longitude', 'address'
+            ):
+                address_obj = shipment['address']
+                if isinstance(address_obj, dict):
+                    address_text = (
+                        address_obj.get('formattedAddress')
+                        or address_obj.get('address')
+                        or address_obj.get('displayAddress')
+                        or ''
+                    )
+                else:
+                    address_text = str(address_obj or '')
+
+                drop_points_by_employee.setdefault(shipment['employee_id'], []).append({
+                    'id': str(shipment['id']),
+                    'shipment_id': str(shipment['pops_order_id'] or shipment['id']),
+                    'status': shipment['status'],
+                    'type': shipment['type'],
+                    'lat': shipment['latitude'],
+                    'lng': shipment['longitude'],
+                    'address': address_text,
+                })
+
+            riders = []
             for session in active_sessions:
-                locations.append({
-                    'employee_id': session['employee_id'],
+                employee_id = session['employee_id']
+                route_points = route_points_by_session.get(session['id'], [])
+                riders.append({
+                    'employee_id': employee_id,
+                    'employee_name': employee_name_map.get(employee_id) or f'Employee {employee_id}',
                     'latitude': session['current_latitude'],
                     'longitude': session['current_longitude'],
                     'timestamp': session['last_updated'].isoformat() if session['last_updated'] else None,
                     'session_id': session['id'],
-                    'start_time': session['start_time'].isoformat()
+                    'start_time': session['start_time'].isoformat() if session['start_time'] else None,
+                    'status': 'active',
+                    'route': route_points[-ACTIVE_RIDER_ROUTE_POINTS_LIMIT:],
+                    'drop_points': drop_points_by_employee.get(employee_id, []),
                 })
-            
-            return locations
-            
-        except Exception as e:
+
+            return riders
+
+        except DatabaseError as e:
             logger.error(f"Failed to get active riders locations: {e}")
             return []
 
@@ -441,15 +892,14 @@ def finalize_session_metrics(session):
     #        backgrounded or closed: the trail may be incomplete, but the
     #        confirmed stops are reliable (the rider taps each one). Falls back
     #        to the filtered GPS trail only when there aren't enough stops. ---
-    confirmed_stops = [
-        (e['latitude'], e['longitude'])
-        for e in (
-            session.tracking_points
-            .filter(event_type__in=['pickup', 'delivery'])
-            .order_by('timestamp')
-            .values('latitude', 'longitude')
-        )
-    ]
+    # The same rows also give the completed-shipment count in step 4
+    stop_events = list(
+        session.tracking_points
+        .filter(event_type__in=['pickup', 'delivery'])
+        .order_by('timestamp')
+        .values_list('latitude', 'longitude', 'shipment_id')
+    )
+    confirmed_stops = [(lat, lng) for lat, lng, _ in stop_events]
 
     total_km = 0.0
     # Stop-to-stop is only meaningful with at least one CONFIRMED stop to trace
@@ -547,13 +997,7 @@ def finalize_session_metrics(session):
     # This was never incremented, so every per-shipment efficiency metric read 0.
     # Derive it from the distinct shipments with a confirmed pickup/delivery event
     # in this session. Events only accumulate, so guard with max for safety.
-    completed = (
-        session.tracking_points
-        .filter(event_type__in=['pickup', 'delivery'])
-        .values('shipment_id')
-        .distinct()
-        .count()
-    )
+    completed = len({shipment_id for _, _, shipment_id in stop_events})
     session.shipments_completed = max(completed, int(session.shipments_completed or 0))
 
     session.save()
@@ -572,32 +1016,32 @@ def _gps_trail_distance_km(session):
     NOTE: this under-counts when the web app was backgrounded/closed during the
     route (gaps in the trail) — which is exactly why stop-to-stop is preferred.
     """
-    import math
     MAX_ACCURACY_M = 50
     MIN_SEGMENT_KM = 0.010
     EARTH_R_KM = 6371.0
-    points = list(
+    # Poor fixes are dropped by the query; each point's radians and cos(lat)
+    # are computed once and carried into the next segment
+    points = (
         session.tracking_points
         .filter(event_type='gps')
+        .filter(Q(accuracy__isnull=True) | Q(accuracy__lte=MAX_ACCURACY_M))
         .order_by('timestamp')
-        .values('latitude', 'longitude', 'accuracy')
+        .values_list('latitude', 'longitude')
     )
     total = 0.0
     prev = None
-    for p in points:
-        if p['accuracy'] is not None and p['accuracy'] > MAX_ACCURACY_M:
-            continue
+    for latitude, longitude in points:
+        lat = math.radians(latitude)
+        lon = math.radians(longitude)
+        cos_lat = math.cos(lat)
         if prev is not None:
-            dlat = math.radians(p['latitude'] - prev['latitude'])
-            dlon = math.radians(p['longitude'] - prev['longitude'])
+            prev_lat, prev_lon, prev_cos_lat = prev
             a = (
-                math.sin(dlat / 2) ** 2
-                + math.cos(math.radians(prev['latitude']))
-                * math.cos(math.radians(p['latitude']))
-                * math.sin(dlon / 2) ** 2
+                math.sin((lat - prev_lat) / 2) ** 2
+                + prev_cos_lat * cos_lat * math.sin((lon - prev_lon) / 2) ** 2
             )
             seg = EARTH_R_KM * 2 * math.asin(math.sqrt(max(0.0, a)))
             if seg >= MIN_SEGMENT_KM:
                 total += seg
-        prev = p
+        prev = (lat, lon, cos_lat)
     return total
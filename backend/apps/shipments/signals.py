@@ -5,11 +5,15 @@ Automatically sends callbacks to external systems when shipments are updated
 import logging
 import threading
 from django.db import transaction
-from django.db.models.signals import post_save, pre_save
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.utils import timezone
-from .models import Shipment
+from .models import Shipment, RouteSession
 from .external_callback_service import ExternalCallbackService
+from .services import (
+    ACTIVE_SESSION_CACHE_TTL, SYNC_BOOKKEEPING_FIELDS, active_session_cache_key
+)
 
 logger = logging.getLogger(__name__)
 
@@ -19,17 +23,28 @@ def track_shipment_status_change(sender, instance, **kwargs):
     """
     Track status changes before saving
     """
+    update_fields = kwargs.get('update_fields')
+    if update_fields and update_fields <= SYNC_BOOKKEEPING_FIELDS:
+        # Sync bookkeeping can't change the status; skip the diff
+        instance._status_changed = False
+        return
     if instance.pk:  # Only for existing shipments
-        try:
-            old_instance = Shipment.objects.get(pk=instance.pk)
-            instance._old_status = old_instance.status
-            instance._status_changed = old_instance.status != instance.status
-        except Shipment.DoesNotExist:
-            instance._old_status = None
-            instance._status_changed = False
+        if hasattr(instance, '_loaded_status'):
+            # Loaded from the DB (Shipment.from_db): diff in memory
+            found, old_status = True, instance._loaded_status
+        else:
+            # Built by hand with a pk, or loaded with status deferred
+            rows = list(Shipment.objects.filter(pk=instance.pk).values_list('status', flat=True)[:1])
+            found, old_status = bool(rows), (rows[0] if rows else None)
+        instance._old_status = old_status
+        instance._status_changed = found and old_status != instance.status
+        if update_fields is None or 'status' in update_fields:
+            # The next save of this instance diffs against what this one writes
+            instance._loaded_status = instance.status
     else:
         instance._old_status = None
         instance._status_changed = False
+        instance._loaded_status = instance.status
 
 
 def _dispatch_callback_async(shipment, status_change, event_type):
@@ -45,6 +60,20 @@ def _dispatch_callback_async(shipment, status_change, event_type):
     threading.Thread(target=_run, daemon=True).start()
 
 
+def _dispatch_callbacks_async(callbacks):
+    """Send a list of (shipment, status_change, event_type) callbacks in order on
+    one daemon thread, for bulk writes that would otherwise start a thread each."""
+    def _run():
+        for shipment, status_change, event_type in callbacks:
+            try:
+                ExternalCallbackService.send_shipment_update(
+                    shipment, status_change=status_change, event_type=event_type
+                )
+            except Exception as e:
+                logger.error(f"Async callback failed for shipment {shipment.id}: {e}")
+    threading.Thread(target=_run, daemon=True).start()
+
+
 @receiver(post_save, sender=Shipment)
 def send_shipment_update_callback(sender, instance, created, **kwargs):
     """
@@ -57,6 +86,11 @@ def send_shipment_update_callback(sender, instance, created, **kwargs):
     if getattr(instance, '_suppress_callback', False):
         return
 
+    # Sync bookkeeping writes are internal and never notify the partner.
+    update_fields = kwargs.get('update_fields')
+    if update_fields and update_fields <= SYNC_BOOKKEEPING_FIELDS:
+        return
+
     if created:
         status_change = f"Shipment created with status: {instance.status}"
         event_type = "shipment_created"
@@ -71,12 +105,53 @@ def send_shipment_update_callback(sender, instance, created, **kwargs):
 
     logger.info(f"Queuing {event_type} callback for shipment {instance.id}")
     # #12: defer until after commit so a rolled-back txn can't fire a phantom callback.
-    transaction.on_commit(lambda: _dispatch_callback_async(instance, status_change, event_type))
-    # Delivery confirmation is a distinct event the partner expects.
+    # Delivery confirmation is a distinct event the partner expects; it goes out
+    # right after the status update on the same thread.
     if (not created) and instance.status in ['Delivered', 'Picked Up']:
-        transaction.on_commit(
-            lambda: _dispatch_callback_async(instance, status_change, "delivery_confirmation")
-        )
+        callbacks = [
+            (instance, status_change, event_type),
+            (instance, status_change, "delivery_confirmation"),
+        ]
+        transaction.on_commit(lambda: _dispatch_callbacks_async(callbacks))
+    else:
+        transaction.on_commit(lambda: _dispatch_callback_async(instance, status_change, event_type))
+
+
+def queue_created_callbacks(shipments):
+    """
+    Queue the shipment_created callbacks that post_save would have sent, for
+    shipments inserted with bulk_create (which skips model signals)
+    """
+    callbacks = [
+        (shipment, f"Shipment created with status: {shipment.status}", "shipment_created")
+        for shipment in shipments
+        if not getattr(shipment, '_suppress_callback', False)
+    ]
+    if callbacks:
+        logger.info(f"Queuing shipment_created callbacks for {len(callbacks)} shipments")
+        transaction.on_commit(lambda: _dispatch_callbacks_async(callbacks))
+
+
+def queue_status_change_callbacks(shipments, old_statuses):
+    """
+    Queue the status_update (and delivery_confirmation) callbacks that
+    post_save would have sent, for shipments updated with bulk_update.
+    old_statuses maps shipment id -> status before the update.
+    """
+    callbacks = []
+    for shipment in shipments:
+        if getattr(shipment, '_suppress_callback', False):
+            continue
+        old_status = old_statuses.get(shipment.id)
+        if old_status == shipment.status:
+            continue
+        status_change = f"Status changed from {old_status} to {shipment.status}"
+        callbacks.append((shipment, status_change, "status_update"))
+        if shipment.status in ['Delivered', 'Picked Up']:
+            callbacks.append((shipment, status_change, "delivery_confirmation"))
+    if callbacks:
+        logger.info(f"Queuing {len(callbacks)} status callbacks")
+        transaction.on_commit(lambda: _dispatch_callbacks_async(callbacks))
 
 
 # Optional: Signal for batch operations
@@ -95,4 +170,25 @@ def send_batch_shipment_callbacks(shipments, event_type="batch_update"):
         return results
     except Exception as e:
         logger.error(f"Failed to send batch callbacks: {e}")
-        return {}
\ No newline at end of file
+        return {}
+
+@receiver(post_save, sender=RouteSession)
+def invalidate_active_session_cache(sender, instance, created, **kwargs):
+    """
+    Drop the cached rider -> active session mapping used by GPS ingest
+    whenever a session is created or changes (e.g. stopped). A newly started
+    session is the rider's latest active one, so once it commits the cache is
+    primed with it and the first ping skips the lookup. Only this worker's
+    cache is touched; other workers find their cached id superseded on the
+    next write and resolve it again.
+    """
+    active_key = active_session_cache_key(instance.employee_id)
+    cache.delete(active_key)
+    if created and instance.status == 'active':
+        transaction.on_commit(lambda: cache.set(active_key, instance.id, ACTIVE_SESSION_CACHE_TTL))
+
+
+@receiver(post_delete, sender=RouteSession)
+def invalidate_deleted_session_cache(sender, instance, **kwargs):
+    """Forget a deleted session in the GPS ingest cache"""
+    cache.delete(active_session_cache_key(instance.employee_id))
@@ -1,3 +1,1040 @@
-from django.test import TestCase
+import threading
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import DatabaseError, connection
+from django.http import QueryDict
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
+
+from apps.authentication.models import User
+from django.utils import timezone
+
+from .models import OrderEvent, RouteSession, RouteTracking, Shipment
+from .pops_order_receiver import (
+    receive_order_from_pops, receive_orders_from_pops_bulk, update_shipment_status_from_pops,
+)
+from .routing import HaversineBackend
+from .services import (
+    POPS_SYNC_RETRY_DELAYS, RoutePlanningService, ShipmentStatusService,
+    _BackgroundWorkers, _gps_trail_distance_km, location_tracking,
+)
+from .serializers import (
+    BulkShipmentEventSerializer, RouteOptimizeRequestSerializer,
+    RouteSessionSerializer, RouteTrackingSerializer, ShipmentSerializer,
+    format_address, parse_coordinate,
+)
+from .views import _status_type_error
+
+
+class FormatAddressTests(SimpleTestCase):
+    """Tests for the address display helper"""
+
+    def test_dict_address(self):
+        address = {'address': '12 MG Road', 'city': 'Bengaluru', 'pincode': '560001'}
+        self.assertEqual(format_address(address), '12 MG Road, Bengaluru, 560001')
+        # Second call is served from the memo and must be identical
+        self.assertEqual(format_address(dict(address)), '12 MG Road, Bengaluru, 560001')
+
+    def test_unhashable_values_fall_back(self):
+        address = {'place_name': 'Hub', 'city': 'Pune', 'extra': {'floor': 2}}
+        self.assertEqual(format_address(address), 'Hub, Pune')
+
+    def test_empty_and_string(self):
+        self.assertEqual(format_address(None), 'No address')
+        self.assertEqual(format_address({}), 'No address')
+        self.assertEqual(format_address('Plain text'), 'Plain text')
+
+
+class ParseCoordinateTests(SimpleTestCase):
+    """Tests for GPS ping validation"""
+
+    def test_valid_ping(self):
+        coordinate = parse_coordinate({
+            'sessionId': 'sess-1', 'latitude': '12.97', 'longitude': 77.59,
+            'accuracy': 5, 'timestamp': '2024-05-01T10:00:00Z',
+        })
+        self.assertEqual(
+            (coordinate.session_id, coordinate.latitude, coordinate.longitude, coordinate.accuracy),
+            ('sess-1', 12.97, 77.59, 5.0),
+        )
+        self.assertEqual(coordinate.timestamp.isoformat(), '2024-05-01T10:00:00+00:00')
+        self.assertIsNone(coordinate.speed)
+
+    def test_invalid_fields_are_reported(self):
+        with self.assertRaises(ValidationError) as ctx:
+            parse_coordinate({'latitude': 'north', 'timestamp': 'yesterday'})
+        self.assertEqual(
+            set(ctx.exception.detail), {'session_id', 'latitude', 'longitude', 'timestamp'}
+        )
+
+
+class CamelCaseAliasTests(SimpleTestCase):
+    """Serializers accept camelCase keys from mobile clients"""
+
+    def test_json_payload(self):
+        serializer = BulkShipmentEventSerializer(data={
+            'sessionId': 'sess-1', 'shipmentIds': ['1', '2'], 'eventType': 'delivery',
+            'latitude': 12.9, 'longitude': 77.6,
+        })
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        self.assertEqual(serializer.validated_data['session_id'], 'sess-1')
+        self.assertEqual(serializer.validated_data['shipment_ids'], ['1', '2'])
+
+    def test_snake_case_wins(self):
+        serializer = RouteOptimizeRequestSerializer(data={
+            'current_latitude': 12.9, 'currentLatitude': 1.0, 'currentLongitude': 77.6, 'locations': [],
+        })
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        self.assertEqual(
+            (serializer.validated_data['current_latitude'], serializer.validated_data['current_longitude']),
+            (12.9, 77.6),
+        )
+
+    def test_form_payload(self):
+        data = QueryDict(mutable=True)
+        data.update({'sessionId': 'sess-1', 'eventType': 'pickup', 'latitude': '12.9', 'longitude': '77.6'})
+        data.setlist('shipment_ids', ['1', '2'])
+        serializer = BulkShipmentEventSerializer(data=data)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        self.assertEqual(
+            (serializer.validated_data['session_id'], serializer.validated_data['event_type']),
+            ('sess-1', 'pickup'),
+        )
+        self.assertIn('sessionId', data)
+
+
+class StatusTypeRuleTests(SimpleTestCase):
+    """Statuses restricted to one shipment type"""
+
+    def test_rules(self):
+        self.assertIsNone(_status_type_error('Delivered', 'delivery'))
+        self.assertIsNone(_status_type_error('Picked Up', 'pickup'))
+        self.assertIsNone(_status_type_error('Collected', 'delivery'))
+        self.assertIsNone(_status_type_error('Returned', 'pickup'))
+        self.assertEqual(_status_type_error('Delivered', 'pickup'), 'Cannot mark a pickup shipment as Delivered')
+        self.assertEqual(_status_type_error('Picked Up', None), 'Cannot mark a delivery shipment as Picked Up')
+        self.assertIsNotNone(_status_type_error('Collected', 'pickup'))
+
+
+class AddressDisplayAnnotationTests(TestCase):
+    """The database-side address_display must agree with format_address"""
+
+    def test_annotation_matches_python_formatting(self):
+        addresses = [
+            {'address': '12 MG Road', 'city': 'Bengaluru', 'pincode': 560001},
+            {'address': '', 'place_name': 'Hub', 'state': 'KA', 'country': 'IN'},
+            {'landmark': 'Near park'},
+            'Legacy string address',
+        ]
+        for address in addresses:
+            Shipment.objects.create(
+                type='delivery', customer_name='C', customer_mobile='9999999999',
+                address=address, cost=0, delivery_time=timezone.now(),
+                route_name='R1', employee_id='EMP1',
+            )
+        shipments = Shipment.objects.annotate(
+            _addr_display=ShipmentSerializer.address_display_expression()
+        ).order_by('id')
+        for shipment in shipments:
+            self.assertEqual(
+                ShipmentSerializer(shipment).data['address_display'],
+                format_address(shipment.address),
+            )
+
+
+class RouteSessionSerializerTests(TestCase):
+    """Tests for tracking point serialization on route sessions"""
+
+    def setUp(self):
+        now = timezone.now()
+        self.session = RouteSession.objects.create(
+            id='sess-test-1', employee_id='EMP1', start_time=now,
+            start_latitude=12.9, start_longitude=77.6,
+        )
+        RouteTracking.objects.bulk_create([
+            RouteTracking(
+                session=self.session, employee_id='EMP1',
+                latitude=12.9 + i * 0.001, longitude=77.6,
+                timestamp=now + timedelta(seconds=i),
+            )
+            for i in range(RouteSessionSerializer.TRACKING_POINTS_LIMIT + 5)
+        ])
+
+    def test_prefetched_points_are_limited(self):
+        sessions = RouteSession.objects.prefetch_related(
+            RouteSessionSerializer.tracking_points_prefetch()
+        )
+        data = RouteSessionSerializer(sessions, many=True).data
+        self.assertEqual(len(data[0]['tracking_points']), RouteSessionSerializer.TRACKING_POINTS_LIMIT)
+
+    def test_unprefetched_instance_falls_back(self):
+        data = RouteSessionSerializer(self.session).data
+        self.assertEqual(len(data['tracking_points']), RouteSessionSerializer.TRACKING_POINTS_LIMIT)
+        self.assertEqual(data['tracking_points'][0]['latitude'], 12.9)
+
+    def test_to_list_matches_serializer(self):
+        points = self.session.tracking_points.order_by('timestamp')[:3]
+        expected = RouteTrackingSerializer(points, many=True).data
+        self.assertEqual(RouteTrackingSerializer.to_list(points), [dict(row) for row in expected])
+
+
+class ShipmentWriteTests(TestCase):
+    """Tests for the single-shipment write endpoints"""
+
+    def setUp(self):
+        self.user = User.objects.create(username='admin', role='admin', is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.shipment = Shipment.objects.create(
+            type='delivery', customer_name='C', customer_mobile='9999999999',
+            address='Somewhere', cost=0, delivery_time=timezone.now(),
+            route_name='R1', employee_id='EMP1', status='In Transit',
+            sync_status='synced', synced_to_external=True, remarks='Ring twice',
+        )
+
+    def _shipment_updates(self, queries):
+        return [q for q in queries if q['sql'].startswith('UPDATE "shipments"')]
+
+    def test_update_resets_sync_in_one_write(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(
+                f'/api/v1/shipments/{self.shipment.id}/', {'route_name': 'R2'}, format='json'
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self._shipment_updates(queries)), 1)
+        self.shipment.refresh_from_db()
+        self.assertEqual((self.shipment.route_name, self.shipment.sync_status), ('R2', 'pending'))
+        self.assertFalse(self.shipment.synced_to_external)
+
+    def test_tracking_writes_only_sent_fields(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(
+                f'/api/v1/shipments/{self.shipment.id}/tracking',
+                {'km_travelled': 4.5, 'actualDeliveryTime': '2024-05-01T10:00:00Z', 'remarks': 'ignored'},
+                format='json'
+            )
+
+        self.assertEqual(response.status_code, 200)
+        [update] = self._shipment_updates(queries)
+        self.assertNotIn('"remarks"', update['sql'])
+        self.shipment.refresh_from_db()
+        self.assertEqual((self.shipment.km_travelled, self.shipment.sync_status), (4.5, 'pending'))
+        self.assertEqual(self.shipment.actual_delivery_time.isoformat(), '2024-05-01T10:00:00+00:00')
+        self.assertEqual(self.shipment.remarks, 'Ring twice')
+
+    def test_destroy_marks_deleted(self):
+        with mock.patch('apps.shipments.signals._dispatch_callback_async') as dispatch, \
+                CaptureQueriesContext(connection) as queries, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(f'/api/v1/shipments/{self.shipment.id}/')
+
+        self.assertEqual(response.status_code, 200)
+        [update] = self._shipment_updates(queries)
+        self.assertNotIn('"remarks"', update['sql'])
+        self.shipment.refresh_from_db()
+        self.assertEqual(self.shipment.status, 'Deleted')
+        self.assertEqual(dispatch.call_args.args[2], 'status_update')
+
+    def test_fetch_reuses_count_across_pages(self):
+        cache.clear()
+        response = self.client.get('/api/v1/shipments/fetch', {'page': 1, 'status': 'In Transit'})
+        self.assertEqual(response['X-Total-Count'], '1')
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/v1/shipments/fetch', {'page': 2, 'status': 'In Transit'})
+        self.assertFalse([q for q in queries if 'COUNT(' in q['sql']])
+        self.assertEqual(response['X-Total-Count'], '1')
+
+        Shipment.objects.create(
+            type='delivery', customer_name='C', customer_mobile='9999999999',
+            address='Somewhere', cost=0, delivery_time=timezone.now(),
+            route_name='R1', employee_id='EMP1', status='In Transit',
+        )
+        response = self.client.get(
+            '/api/v1/shipments/fetch', {'page': 1, 'status': 'In Transit', 'exact_count': 'true'}
+        )
+        self.assertEqual(response['X-Total-Count'], '2')
+
+    def test_fetch_skips_unrendered_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/v1/shipments/fetch', {'exact_count': 'true'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]['remarks'], 'Ring twice')
+        [select] = [q['sql'] for q in queries if q['sql'].startswith('SELECT "shipments"')]
+        self.assertNotIn('"sync_error"', select)
+
+    def test_fetch_cursor_pages(self):
+        for _ in range(4):
+            Shipment.objects.create(
+                type='delivery', customer_name='C', customer_mobile='9999999999',
+                address='Somewhere', cost=0, delivery_time=timezone.now(),
+                route_name='R1', employee_id='EMP1', status='Assigned',
+            )
+        expected = list(Shipment.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+
+        seen = []
+        cursor = ''
+        while True:
+            response = self.client.get('/api/v1/shipments/fetch', {'cursor': cursor, 'limit': 2})
+            self.assertEqual(response.status_code, 200)
+            seen.extend(row['id'] for row in response.json())
+            if response['X-Has-Next-Page'] == 'false':
+                self.assertNotIn('X-Next-Cursor', response)
+                break
+            cursor = response['X-Next-Cursor']
+
+        self.assertEqual(seen, expected)
+        response = self.client.get('/api/v1/shipments/fetch', {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/api/v1/shipments/fetch', {'cursor': '', 'ordering': 'created_at'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_batch_writes_each_field_set_once(self):
+        pickup = Shipment.objects.create(
+            type='pickup', customer_name='C', customer_mobile='9999999999',
+            address='Somewhere', cost=0, delivery_time=timezone.now(),
+            route_name='R1', employee_id='EMP1', status='Assigned',
+        )
+        updates = [
+            {'id': self.shipment.id, 'status': 'Delivered', 'remarks': 'Left at door'},
+            {'id': pickup.id, 'status': 'Picked Up'},
+            {'id': str(self.shipment.id), 'status': 'Returned'},
+            {'id': 999999, 'status': 'Delivered'},
+            {'id': 'abc', 'status': 'Delivered'},
+        ]
+
+        with mock.patch('apps.shipments.signals._dispatch_callbacks_async') as dispatch, \
+                CaptureQueriesContext(connection) as queries, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch('/api/v1/shipments/batch', {'updates': updates}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(
+            [result['success'] for result in body['results']],
+            [True, True, True, False, False],
+        )
+        self.assertEqual((body['updated'], body['skipped'], body['failed']), (2, 1, 2))
+        # One write per field set; the status-only row never writes remarks back
+        self.assertEqual(
+            sorted('"remarks"' in q['sql'] for q in self._shipment_updates(queries)), [False, True]
+        )
+        self.shipment.refresh_from_db()
+        pickup.refresh_from_db()
+        self.assertEqual((self.shipment.status, self.shipment.remarks), ('Delivered', 'Left at door'))
+        self.assertEqual((pickup.status, pickup.sync_status), ('Picked Up', 'pending'))
+        [callbacks] = dispatch.call_args.args
+        self.assertEqual(
+            [event_type for _, _, event_type in callbacks],
+            ['status_update', 'delivery_confirmation', 'status_update', 'delivery_confirmation'],
+        )
+
+    def test_batch_field_groups_commit_together(self):
+        pickup = Shipment.objects.create(
+            type='pickup', customer_name='C', customer_mobile='9999999999',
+            address='Somewhere', cost=0, delivery_time=timezone.now(),
+            route_name='R1', employee_id='EMP1', status='Assigned',
+        )
+        updates = [
+            {'id': self.shipment.id, 'status': 'Delivered', 'remarks': 'Left at door'},
+            {'id': pickup.id, 'status': 'Picked Up'},
+        ]
+        bulk_update = Shipment.objects.bulk_update
+        calls = []
+
+        def fail_second_group(*args, **kwargs):
+            calls.append(args)
+            if len(calls) == 2:
+                raise DatabaseError('write failed')
+            return bulk_update(*args, **kwargs)
+
+        self.client.raise_request_exception = False
+        with mock.patch.object(Shipment.objects, 'bulk_update', side_effect=fail_second_group), \
+                self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.patch('/api/v1/shipments/batch', {'updates': updates}, format='json')
+
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(callbacks, [])
+        self.shipment.refresh_from_db()
+        pickup.refresh_from_db()
+        self.assertEqual((self.shipment.status, pickup.status), ('In Transit', 'Assigned'))
+
+
+class CoordinateBatchTests(TestCase):
+    """Tests for submitting buffered GPS points"""
+
+    def setUp(self):
+        self.user = User.objects.create(username='EMP1', role='driver')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        for session_id, employee_id in (('sess-own', 'EMP1'), ('sess-other', 'EMP2')):
+            RouteSession.objects.create(
+                id=session_id, employee_id=employee_id, start_time=timezone.now(),
+                start_latitude=12.9, start_longitude=77.6,
+            )
+
+    def test_results_keep_submission_order(self):
+        response = self.client.post('/api/v1/routes/coordinates/batch', {'coordinates': [
+            {'sessionId': 'sess-own', 'latitude': 12.91, 'longitude': 77.61},
+            {'sessionId': 'sess-other', 'latitude': 12.92, 'longitude': 77.62},
+            {'latitude': 'north'},
+            {'sessionId': 'sess-own', 'latitude': 12.93, 'longitude': 77.63, 'speed': 4},
+        ]}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual([result['success'] for result in results], [True, False, False, True])
+        self.assertEqual(results[1]['error'], 'Session not found')
+        self.assertEqual(response.json()['summary'], {'total': 4, 'successful': 2, 'failed': 2})
+        self.assertEqual(RouteTracking.objects.filter(session_id='sess-own').count(), 2)
+        self.assertFalse(RouteTracking.objects.filter(session_id='sess-other').exists())
+
+    def test_sync_coordinates(self):
+        response = self.client.post('/api/v1/routes/sync-coordinates', {
+            'session_id': 'sess-own',
+            'coordinates': [
+                {'latitude': 12.91, 'longitude': 77.61, 'timestamp': '2024-05-01T10:00:00Z'},
+                {'latitude': 12.92},
+            ],
+        }, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body['summary'], {'total': 2, 'successful': 1, 'failed': 1})
+        self.assertEqual(body['results'][0]['timestamp'], '2024-05-01T15:30:00+05:30')
+        self.assertEqual(body['results'][0]['session'], 'sess-own')
+        self.assertEqual(RouteTracking.objects.filter(session_id='sess-own').count(), 1)
+
+
+class RouteVisualizationTests(TestCase):
+    """Tests for the route visualization payload"""
+
+    def setUp(self):
+        self.user = User.objects.create(username='admin', role='admin', is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _create_session(self, session_id):
+        session = RouteSession.objects.create(
+            id=session_id, employee_id='EMP1', start_time=timezone.now(),
+            start_latitude=12.9, start_longitude=77.6,
+        )
+        now = timezone.now()
+        RouteTracking.objects.bulk_create([
+            RouteTracking(
+                session=session, employee_id='EMP1', latitude=12.9, longitude=77.6,
+                timestamp=now - timedelta(seconds=i),
+            )
+            for i in range(3)
+        ])
+
+    def test_points_are_ordered_without_per_session_queries(self):
+        self._create_session('sess-vis-1')
+        with CaptureQueriesContext(connection) as one_session:
+            self.client.get('/api/v1/routes/visualization')
+        self._create_session('sess-vis-2')
+        with CaptureQueriesContext(connection) as two_sessions:
+            response = self.client.get('/api/v1/routes/visualization')
+
+        self.assertEqual(len(two_sessions), len(one_session))
+        for session in response.json()['sessions']:
+            timestamps = [point['timestamp'] for point in session['points']]
+            self.assertEqual(timestamps, sorted(timestamps))
+
+
+@override_settings(TIME_ZONE='UTC')
+class DashboardMetricsTests(TestCase):
+    """Tests for today's dashboard counters"""
+
+    def setUp(self):
+        self.user = User.objects.create(username='admin', role='admin', is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        now = timezone.now()
+        for shipment_status, cost, delivered_after in (
+            ('Delivered', 100, timedelta(hours=2)),
+            ('Picked Up', 50, None),
+            ('In Transit', 30, None),
+            ('Collected', 20, None),
+        ):
+            Shipment.objects.create(
+                type='delivery', customer_name='C', customer_mobile='9999999999',
+                address='Somewhere', cost=cost, delivery_time=now, route_name='R1',
+                employee_id='EMP1', status=shipment_status,
+                actual_delivery_time=now + delivered_after if delivered_after else None,
+            )
+
+    def test_metrics(self):
+        response = self.client.get('/api/v1/dashboard/metrics/')
+
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body['total_shipments'], 4)
+        self.assertEqual(body['delivered_shipments'], 1)
+        self.assertEqual(body['in_progress_shipments'], 2)
+        self.assertEqual(body['pending_shipments'], 0)
+        self.assertEqual(body['total_revenue'], 150)
+        self.assertEqual(body['average_delivery_time'], 2)
+        self.assertEqual(body['route_breakdown']['R1']['total'], 4)
+
+
+@override_settings(TEST_MODE=True)
+class BulkShipmentEventTests(TestCase):
+    """Tests for recording one event against many shipments"""
+
+    def setUp(self):
+        self.user = User.objects.create(username='EMP1', role='driver')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.session = RouteSession.objects.create(
+            id='sess-bulk-1', employee_id='EMP1', start_time=timezone.now(),
+            start_latitude=12.9, start_longitude=77.6,
+        )
+        self.shipments = [
+            Shipment.objects.create(
+                type='delivery', customer_name='C', customer_mobile='9999999999',
+                address='Somewhere', cost=0, delivery_time=timezone.now(),
+                route_name='R1', employee_id=employee_id, status='In Transit',
+            )
+            for employee_id in ('EMP1', 'EMP1', 'EMP2')
+        ]
+
+    def test_bulk_delivery(self):
+        own_a, own_b, other = self.shipments
+        ids = [str(own_a.id), str(own_b.id), str(own_a.id), str(other.id), '999999', 'abc']
+        response = self.client.post('/api/v1/routes/bulk_shipment_event', {
+            'session_id': self.session.id, 'shipment_ids': ids,
+            'event_type': 'delivery', 'latitude': 12.95, 'longitude': 77.61,
+        }, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body['updated'], 2)
+        self.assertEqual(
+            [result['success'] for result in body['results']],
+            [True, True, True, False, False, False],
+        )
+        self.assertEqual(
+            RouteTracking.objects.filter(session=self.session, event_type='delivery').count(), 2
+        )
+        own_a.refresh_from_db()
+        other.refresh_from_db()
+        self.assertEqual(own_a.status, 'Delivered')
+        self.assertIsNotNone(own_a.actual_delivery_time)
+        self.assertEqual(other.status, 'In Transit')
+        self.assertIsNone(other.actual_delivery_time)
+        self.assertEqual(
+            OrderEvent.objects.filter(new_status='Delivered', metadata__bulk_event=True).count(), 2
+        )
+
+    def test_single_delivery_event_reads_shipment_once(self):
+        manager = User.objects.create(username='MGR1', role='manager')
+        self.client.force_authenticate(manager)
+        session = RouteSession.objects.create(
+            id='sess-mgr-1', employee_id='MGR1', start_time=timezone.now(),
+            start_latitude=12.9, start_longitude=77.6,
+        )
+        shipment = self.shipments[2]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/v1/routes/shipment-event', {
+                'session_id': session.id, 'shipment_id': str(shipment.id),
+                'event_type': 'delivery', 'latitude': 12.95, 'longitude': 77.61,
+            }, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        shipment.refresh_from_db()
+        self.assertEqual(shipment.status, 'Delivered')
+        self.assertIsNotNone(shipment.actual_delivery_time)
+        self.assertEqual(OrderEvent.objects.filter(shipment=shipment, new_status='Delivered').count(), 1)
+        shipment_selects = [
+            q for q in queries
+            if q['sql'].startswith('SELECT') and q['sql'].split(' WHERE ')[0].endswith('FROM "shipments"')
+        ]
+        self.assertEqual(len(shipment_selects), 1)
+
+    def test_route_shipments_read_once(self):
+        with mock.patch('apps.shipments.geocoding.geocode_address', return_value=(12.95, 77.61)), \
+                CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/v1/routes/shipments')
+
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body['count'], 2)
+        self.assertEqual([row['latitude'] for row in body['shipments']], [12.95, 12.95])
+        self.assertEqual(
+            len([q for q in queries if q['sql'].startswith('SELECT') and 'FROM "shipments"' in q['sql']]), 1
+        )
+
+
+class ShipmentStatusServiceTests(TestCase):
+    """Tests for status changes through ShipmentStatusService"""
+
+    def setUp(self):
+        self.shipments = [
+            Shipment.objects.create(
+                type='delivery', customer_name='C', customer_mobile='9999999999',
+                address='Somewhere', cost=0, delivery_time=timezone.now(),
+                route_name='R1', employee_id='EMP1', status=status_value,
+            )
+            for status_value in ('Collected', 'Collected', 'Delivered')
+        ]
+
+    def test_bulk_update_matches_single_updates(self):
+        with mock.patch('apps.shipments.signals._dispatch_callbacks_async') as dispatch, \
+                self.captureOnCommitCallbacks(execute=True):
+            events = ShipmentStatusService.update_status_bulk(
+                self.shipments, 'Delivered', triggered_by='tester'
+            )
+
+        self.assertEqual([event.old_status for event in events], ['Collected', 'Collected', 'Delivered'])
+        self.assertEqual(
+            OrderEvent.objects.filter(event_type='status_change', new_status='Delivered').count(), 3
+        )
+        for shipment in self.shipments:
+            shipment.refresh_from_db()
+            self.assertEqual((shipment.status, shipment.sync_status), ('Delivered', 'pending'))
+        # status_update + delivery_confirmation for the two that changed, as post_save
+        # sends, handed to a single dispatch
+        dispatch.assert_called_once()
+        self.assertEqual(
+            [event_type for _, _, event_type in dispatch.call_args.args[0]],
+            ['status_update', 'delivery_confirmation'] * 2,
+        )
+
+    def test_single_update_writes_status_columns(self):
+        shipment = self.shipments[0]
+        Shipment.objects.filter(id=shipment.id).update(remarks='set elsewhere')
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            _, event = ShipmentStatusService.update_status(shipment, 'In Transit')
+
+        shipment.refresh_from_db()
+        self.assertEqual(shipment.status, 'In Transit')
+        self.assertEqual(shipment.remarks, 'set elsewhere')
+        self.assertEqual(event.old_status, 'Collected')
+        self.assertEqual(len(callbacks), 1)
+
+    def test_status_change_detected_without_reloading(self):
+        shipment = Shipment.objects.get(id=self.shipments[0].id)
+
+        with self.assertNumQueries(1), self.captureOnCommitCallbacks() as callbacks:
+            shipment.remarks = 'left at gate'
+            shipment.save(update_fields=['remarks'])
+        self.assertEqual(len(callbacks), 0)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            shipment.status = 'In Transit'
+            shipment.save()
+            shipment.save()
+        self.assertEqual(len(callbacks), 1)
+
+        Shipment.objects.filter(id=shipment.id).update(status='Collected')
+        shipment.refresh_from_db()
+        with self.captureOnCommitCallbacks() as callbacks:
+            shipment.save()
+        self.assertEqual(len(callbacks), 0)
+
+    def test_bookkeeping_save_sends_no_callback(self):
+        shipment = Shipment(id=self.shipments[0].id, status='Delivered', sync_status='synced')
+
+        with self.assertNumQueries(1), self.captureOnCommitCallbacks() as callbacks:
+            shipment.save(update_fields=['sync_status', 'updated_at'])
+        self.assertEqual(len(callbacks), 0)
+
+    def test_pops_sync_waits_for_commit(self):
+        shipment = self.shipments[0]
+        shipment.pops_order_id = 4242
+
+        with mock.patch.object(ShipmentStatusService, '_sync_to_pops') as sync, \
+                self.captureOnCommitCallbacks() as callbacks:
+            ShipmentStatusService.update_status(shipment, 'In Transit')
+            sync.assert_not_called()
+
+        # status_update callback + deferred POPS sync
+        self.assertEqual(len(callbacks), 2)
+
+    def test_field_sync_waits_for_commit(self):
+        with mock.patch.object(ShipmentStatusService, '_sync_fields_to_pops') as sync, \
+                self.captureOnCommitCallbacks() as callbacks:
+            ShipmentStatusService.queue_fields_syncs_to_pops([
+                (self.shipments[0].id, 4244, {'remarks': 'Gate locked'}, 'token'),
+                (self.shipments[1].id, 4245, {'remarks': 'Call first'}, 'token'),
+            ])
+            sync.assert_not_called()
+
+        self.assertEqual(len(callbacks), 1)
+
+    def test_field_sync_records_outcome(self):
+        shipment = self.shipments[0]
+
+        with mock.patch('utils.pops_client.pops_client') as client:
+            client.update_order_fields.side_effect = [None, {}]
+            self.assertFalse(
+                ShipmentStatusService._sync_fields_to_pops(shipment.id, 4244, {'remarks': 'Gate locked'}, 'token')
+            )
+            shipment.refresh_from_db()
+            self.assertEqual((shipment.sync_status, shipment.sync_attempts), ('failed', 1))
+
+            self.assertTrue(
+                ShipmentStatusService._sync_fields_to_pops(shipment.id, 4244, {'remarks': 'Gate locked'}, 'token')
+            )
+
+        client.update_order_fields.assert_called_with(4244, {'remarks': 'Gate locked'}, 'token')
+        shipment.refresh_from_db()
+        self.assertEqual((shipment.sync_status, shipment.sync_attempts), ('synced', 0))
+        self.assertTrue(shipment.synced_to_external)
+
+    def test_duplicate_pops_sync_is_skipped(self):
+        cache.clear()
+        shipment = self.shipments[0]
+        shipment.pops_order_id = 4243
+        event = OrderEvent.objects.create(shipment=shipment, event_type='status_change')
+
+        with mock.patch('utils.pops_client.pops_client') as client:
+            client.get_service_token.return_value = 'token'
+            client.update_order_fields.return_value = {}
+            for status_value in ('Delivered', 'Delivered', 'Returned'):
+                self.assertTrue(ShipmentStatusService._sync_to_pops(shipment, event, status_value))
+
+        self.assertEqual(
+            [call.args[1]['status'] for call in client.update_order_fields.call_args_list],
+            ['Delivered', 'Returned'],
+        )
+        shipment.refresh_from_db()
+        self.assertEqual(shipment.sync_status, 'synced')
+
+    def test_failed_pops_sync_counts_attempts(self):
+        cache.clear()
+        shipment = self.shipments[0]
+        shipment.pops_order_id = 4244
+        event = OrderEvent.objects.create(shipment=shipment, event_type='status_change')
+
+        with mock.patch('utils.pops_client.pops_client') as client:
+            client.get_service_token.return_value = 'token'
+            client.update_order_fields.return_value = None
+            self.assertFalse(ShipmentStatusService._sync_to_pops(shipment, event, 'Delivered'))
+            self.assertFalse(ShipmentStatusService._sync_to_pops(shipment, event, 'Delivered'))
+
+        shipment.refresh_from_db()
+        event.refresh_from_db()
+        self.assertEqual((shipment.sync_status, shipment.sync_attempts), ('failed', 2))
+        self.assertEqual(event.sync_error, 'POPS status update failed')
+
+    def test_background_sync_retries_until_superseded(self):
+        shipment = self.shipments[0]
+        event = OrderEvent.objects.create(shipment=shipment, event_type='status_change')
+
+        sync_args = (shipment.id, event.id, 'Collected')
+
+        with mock.patch.object(ShipmentStatusService, '_sync_to_pops', side_effect=[False, True]) as sync, \
+                mock.patch('apps.shipments.services._wait_for_retry'):
+            self.assertEqual(ShipmentStatusService._run_syncs_to_pops([sync_args]), [])
+            self.assertEqual(sync.call_count, 2)
+
+            Shipment.objects.filter(id=shipment.id).update(status='In Transit')
+            self.assertEqual(ShipmentStatusService._run_syncs_to_pops([sync_args]), [])
+            self.assertEqual(sync.call_count, 2)
+
+    def test_background_sync_batch_waits_once_per_round(self):
+        failing, passing = self.shipments[:2]
+        syncs = [
+            (shipment.id, OrderEvent.objects.create(shipment=shipment, event_type='status_change').id, 'Collected')
+            for shipment in (failing, passing)
+        ]
+
+        def attempt(shipment, event, status):
+            return shipment.id == passing.id
+
+        with mock.patch.object(ShipmentStatusService, '_sync_to_pops', side_effect=attempt) as sync, \
+                mock.patch('apps.shipments.services._wait_for_retry') as wait:
+            self.assertEqual(ShipmentStatusService._run_syncs_to_pops(syncs), [syncs[0]])
+
+        self.assertEqual(wait.call_count, len(POPS_SYNC_RETRY_DELAYS))
+        self.assertEqual(sync.call_count, 2 + len(POPS_SYNC_RETRY_DELAYS))
+
+    def test_background_workers_are_bounded(self):
+        workers = _BackgroundWorkers(2, 'test-sync')
+        names = []
+        done = threading.Semaphore(0)
+
+        def job(index):
+            names.append(threading.current_thread().name)
+            done.release()
+
+        for index in range(10):
+            workers.submit(job, index)
+        for _ in range(10):
+            self.assertTrue(done.acquire(timeout=5))
+
+        self.assertLessEqual(set(names), {'test-sync-0', 'test-sync-1'})
+
+
+class GoogleMapsUrlTests(SimpleTestCase):
+    """Tests for the navigation deep link"""
+
+    def test_url_format(self):
+        shipments = [
+            Shipment(latitude=12.9, longitude=77.6),
+            Shipment(latitude=None, longitude=77.0),
+            Shipment(latitude=12.95, longitude=77.65),
+            Shipment(latitude=13.0, longitude=77.7),
+        ]
+        self.assertEqual(
+            RoutePlanningService.generate_google_maps_url(shipments),
+            'https://www.google.com/maps/dir/?api=1&origin=12.9,77.6&destination=13.0,77.7'
+            '&waypoints=12.9,77.6|12.95,77.65&dir_action=navigate',
+        )
+        self.assertEqual(
+            RoutePlanningService.generate_google_maps_url(shipments, (12.0, 77.0), optimize=False),
+            'https://www.google.com/maps/dir/?api=1&origin=12.0,77.0&destination=12.9,77.6'
+            '&waypoints=12.95,77.65|13.0,77.7',
+        )
+        self.assertEqual(RoutePlanningService.generate_google_maps_url(shipments[1:2]), '')
+
+    def test_pickup_origin(self):
+        with_pickup = Shipment(latitude=12.9, longitude=77.6, pickup_address={'lat': 12.5, 'lng': 77.5})
+        partial_pickup = Shipment(latitude=12.9, longitude=77.6, pickup_address={'lat': 12.5})
+        self.assertEqual(
+            RoutePlanningService.generate_google_maps_url([with_pickup], optimize=False),
+            'https://www.google.com/maps/dir/?api=1&origin=12.5,77.5&destination=12.9,77.6',
+        )
+        self.assertEqual(
+            RoutePlanningService.generate_google_maps_url([partial_pickup], optimize=False),
+            'https://www.google.com/maps/dir/?api=1&origin=12.9,77.6&destination=12.9,77.6',
+        )
+
+
+class LocationTrackingServiceTests(TestCase):
+    """Tests for rider location ingest"""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_bulk_points_share_one_session(self):
+        created = location_tracking.track_location_bulk('EMP9', [
+            {'latitude': 12.90, 'longitude': 77.60},
+            {'latitude': 12.91, 'longitude': 77.61, 'speed': 4.2},
+        ])
+        self.assertEqual(len(created), 2)
+        self.assertTrue(all(point.pk for point in created))
+        session = RouteSession.objects.get(employee_id='EMP9')
+        self.assertEqual((session.current_latitude, session.current_longitude), (12.91, 77.61))
+
+        single = location_tracking.track_location('EMP9', 12.92, 77.62)
+        self.assertEqual(single.session_id, session.id)
+        self.assertEqual(RouteTracking.objects.filter(session=session).count(), 3)
+
+    def test_current_location(self):
+        self.assertIsNone(location_tracking.get_user_current_location('EMP9'))
+        tracking = location_tracking.track_location('EMP9', 12.9, 77.6, accuracy=8.0)
+        location = location_tracking.get_user_current_location('EMP9')
+        self.assertEqual((location['latitude'], location['session_id']), (12.9, tracking.session_id))
+
+        RouteSession.objects.filter(id=tracking.session_id).update(status='completed')
+        location = location_tracking.get_user_current_location('EMP9')
+        self.assertEqual(location['accuracy'], 8.0)
+        self.assertEqual(location['timestamp'], tracking.timestamp.isoformat())
+
+    def test_foreign_session_is_rejected(self):
+        location_tracking.track_location('EMP9', 12.9, 77.6)
+        session = RouteSession.objects.get(employee_id='EMP9')
+        self.assertIsNone(location_tracking.track_location('EMP8', 12.9, 77.6, session_id=session.id))
+
+    def test_stopping_session_invalidates_active_mapping(self):
+        first = location_tracking.track_location('EMP9', 12.9, 77.6)
+        session = first.session
+        session.status = 'completed'
+        session.save()
+
+        second = location_tracking.track_location('EMP9', 12.9, 77.6)
+        self.assertNotEqual(second.session_id, session.id)
+
+    def test_stale_cached_session_is_not_written(self):
+        # Changes made through another worker leave this worker's cache as is
+        first = location_tracking.track_location('EMP9', 12.9, 77.6)
+        RouteSession.objects.filter(id=first.session_id).update(status='completed')
+        second = location_tracking.track_location('EMP9', 12.9, 77.6)
+        self.assertNotEqual(second.session_id, first.session_id)
+
+        newer = RouteSession.objects.create(
+            id='sess-newer', employee_id='EMP9', start_time=timezone.now() + timedelta(minutes=1),
+            status='active', start_latitude=12.9, start_longitude=77.6,
+        )
+        cache.set('active_session:EMP9', second.session_id)
+        self.assertEqual(location_tracking.track_location('EMP9', 12.9, 77.6).session_id, newer.id)
+
+        RouteSession.objects.filter(id='sess-newer').delete()
+        self.assertIsNone(location_tracking.track_location('EMP9', 12.9, 77.6, session_id='sess-newer'))
+
+    def test_started_session_primes_ingest_cache(self):
+        previous = location_tracking.track_location('EMP9', 12.9, 77.6).session_id
+        with self.captureOnCommitCallbacks(execute=True):
+            session = RouteSession.objects.create(
+                id='sess-primed', employee_id='EMP9', start_time=timezone.now(), status='active',
+                start_latitude=12.9, start_longitude=77.6,
+            )
+
+        # Tracking INSERT + session position UPDATE, no session lookups
+        with self.assertNumQueries(2):
+            tracking = location_tracking.track_location('EMP9', 12.9, 77.6)
+        self.assertEqual(tracking.session_id, session.id)
+        with self.assertNumQueries(2):
+            location_tracking.track_location('EMP9', 12.9, 77.6, session_id=session.id)
+
+        # A worker that didn't see the start still holds the previous session
+        cache.set('active_session:EMP9', previous)
+        self.assertEqual(location_tracking.track_location('EMP9', 12.9, 77.6).session_id, session.id)
+
+    def test_active_riders_endpoint(self):
+        location_tracking.track_location('EMP9', 12.9, 77.6)
+        Shipment.objects.create(
+            type='delivery', customer_name='C', customer_mobile='9999999999',
+            address={'address': '12 MG Road'}, cost=0, delivery_time=timezone.now(),
+            route_name='R1', employee_id='EMP9', status='In Transit', latitude=12.95, longitude=77.61,
+        )
+        client = APIClient()
+        client.force_authenticate(User.objects.create(username='admin', role='admin', is_staff=True))
+
+        response = client.get('/api/v1/routes/active-riders')
+        self.assertEqual(response.status_code, 200)
+        rider = response.json()['riders'][0]
+        self.assertEqual((rider['employee_id'], rider['employee_name']), ('EMP9', 'Employee EMP9'))
+        self.assertEqual(len(rider['route']), 1)
+        self.assertEqual(rider['drop_points'][0]['address'], '12 MG Road')
+        with self.assertNumQueries(0):
+            self.assertEqual(client.get('/api/v1/routes/active-riders').json()['count'], 1)
+
+    def test_gps_trail_distance_skips_noise(self):
+        now = timezone.now()
+        session = RouteSession.objects.create(
+            id='sess-trail', employee_id='EMP7', start_time=now,
+            start_latitude=12.9, start_longitude=77.6,
+        )
+        trail = [
+            (12.90, 77.60, 5),
+            (12.91, 77.61, 500),  # poor fix, dropped
+            (12.92, 77.62, 5),
+            (12.92001, 77.62001, 5),  # stationary jitter, not counted
+            (12.93, 77.60, None),
+        ]
+        RouteTracking.objects.bulk_create([
+            RouteTracking(
+                session=session, employee_id='EMP7', latitude=lat, longitude=lng,
+                accuracy=accuracy, timestamp=now + timedelta(seconds=i),
+            )
+            for i, (lat, lng, accuracy) in enumerate(trail)
+        ])
+
+        expected = (
+            HaversineBackend._haversine((12.90, 77.60), (12.92, 77.62))
+            + HaversineBackend._haversine((12.92001, 77.62001), (12.93, 77.60))
+        )
+        self.assertAlmostEqual(_gps_trail_distance_km(session), expected, places=9)
+
+
+class PopsOrderReceiverTests(TestCase):
+    """Tests for creating shipments from POPS order payloads"""
+
+    def order(self, order_id, **extra):
+        return {
+            'orderId': order_id, 'recipientName': 'Customer', 'recipientPhone': '9999999999',
+            'deliveryAddress': '12 MG Road', 'estimatedDeliveryTime': '2024-05-01T10:00:00Z',
+            'cost': 150, 'routeName': 'Route A', **extra,
+        }
+
+    def test_bulk_matches_single_order_path(self):
+        existing = receive_order_from_pops(self.order(100), 'EMP1')
+
+        with mock.patch('apps.shipments.signals._dispatch_callbacks_async') as dispatch, \
+                self.captureOnCommitCallbacks(execute=True):
+            shipments = receive_orders_from_pops_bulk([
+                (self.order(100), 'EMP1'),
+                (self.order(101), 'EMP2'),
+                (self.order('not-a-number'), 'EMP2'),
+                (self.order(101), 'EMP2'),
+                (self.order(102), 'N/A'),
+            ])
+
+        self.assertEqual(shipments[0].id, existing.id)
+        self.assertIsNone(shipments[2])
+        self.assertEqual(shipments[1].id, shipments[3].id)
+        self.assertEqual(shipments[4].status, 'Initiated')
+        self.assertEqual(shipments[4].employee_id, 'unassigned')
+        self.assertEqual(Shipment.objects.filter(pops_order_id=101).count(), 1)
+        self.assertEqual(shipments[1].address, {'formattedAddress': '12 MG Road'})
+        self.assertEqual(shipments[1].delivery_time.isoformat(), '2024-05-01T10:00:00+00:00')
+        self.assertEqual(
+            OrderEvent.objects.filter(event_type='order_received').count(), 3
+        )
+        # One creation callback per new shipment, as post_save would queue,
+        # handed to a single dispatch
+        dispatch.assert_called_once()
+        self.assertEqual(
+            [(shipment.id, event_type) for shipment, _, event_type in dispatch.call_args.args[0]],
+            [(shipments[1].id, 'shipment_created'), (shipments[4].id, 'shipment_created')],
+        )
+
+    def test_alias_precedence_ignores_payload_order(self):
+        payload = {'customerName': 'Fallback', 'lng': '77.1', 'lon': '70.0', 'routeName': ''}
+        payload.update(self.order(150, route_name='Route B'))
+
+        shipment = receive_order_from_pops(payload, 'EMP1')
+
+        self.assertEqual(shipment.customer_name, 'Customer')
+        self.assertEqual(shipment.longitude, 77.1)
+        self.assertEqual(shipment.route_name, 'Route A')
+
+    def test_status_update_from_pops(self):
+        shipment = receive_order_from_pops(self.order(200), 'EMP1')
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.assertTrue(update_shipment_status_from_pops(shipment.id, 'in_transit', 200))
+        self.assertFalse(update_shipment_status_from_pops(999999, 'DELIVERED'))
+
+        shipment.refresh_from_db()
+        self.assertEqual(shipment.status, 'In Transit')
+        self.assertEqual(shipment.sync_status, 'synced')
+        event = shipment.events.get(event_type='status_change')
+        self.assertEqual((event.old_status, event.new_status), ('Assigned', 'In Transit'))
+        # Changes that came from POPS are never echoed back
+        self.assertEqual(callbacks, [])
+
+    def test_status_update_rolls_back_without_event(self):
+        shipment = receive_order_from_pops(self.order(201), 'EMP1')
+
+        with mock.patch.object(OrderEvent.objects, 'create', side_effect=DatabaseError('insert failed')):
+            self.assertFalse(update_shipment_status_from_pops(shipment.id, 'DELIVERED', 201))
+
+        shipment.refresh_from_db()
+        self.assertEqual(shipment.status, 'Assigned')
+
+    def test_bulk_status_updates_via_webhook(self):
+        first = receive_order_from_pops(self.order(300), 'EMP1')
+        second = receive_order_from_pops(self.order(301), 'EMP1')
+        client = APIClient()
+        client.force_authenticate(User.objects.create(username='pops-integration'))
+
+        response = client.post('/api/v1/webhooks/order-status', {'updates': [
+            {'order_id': 300, 'shipment_id': first.id, 'status': 'DELIVERED'},
+            {'order_id': 301, 'status': 'CANCELLED'},
+            {'order_id': 999, 'status': 'DELIVERED'},
+            {'order_id': 300, 'shipment_id': first.id, 'status': 5},
+            {'order_id': 301, 'shipment_id': [second.id], 'status': 'DELIVERED'},
+        ]}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['results']
+        self.assertEqual([r['success'] for r in results], [True, True, False, False, False])
+        self.assertEqual(
+            [r['message'] for r in results[3:]], ['Status must be a string', 'Shipment ID must be an integer']
+        )
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual((first.status, second.status), ('Delivered', 'Cancelled'))
+        self.assertEqual(OrderEvent.objects.filter(event_type='status_change').count(), 2)
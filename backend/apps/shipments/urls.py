@@ -3,7 +3,7 @@ URLs for shipments app - matches Node.js endpoint structure
 Includes route tracking and sync URLs (consolidated from routes and sync apps)
 """
 from django.urls import path, include
-from rest_framework.routers import DefaultRouter
+from rest_framework.routers import SimpleRouter
 from .views import (
     ShipmentViewSet, DashboardViewSet,
     RouteSessionViewSet, SyncViewSet
@@ -20,7 +20,7 @@ from .callback_views import (
 from .webhooks import receive_order_webhook, receive_shipments_batch_webhook, order_status_webhook
 from . import admin_views
 
-router = DefaultRouter()
+router = SimpleRouter()
 router.register(r'shipments', ShipmentViewSet, basename='shipment')
 router.register(r'dashboard', DashboardViewSet, basename='dashboard')
 router.register(r'sync', SyncViewSet, basename='sync')
@@ -4,6 +4,7 @@ Views for shipments app
 import logging
 import math
 import base64
+import hashlib
 import uuid
 import os
 from collections import defaultdict
@@ -12,14 +13,17 @@ from drf_spectacular.utils import extend_schema, OpenApiExample, OpenApiParamete
 from drf_spectacular.types import OpenApiTypes
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django.db import transaction
-from django.db.models import Q, Count, Avg, Sum, F
+from django.db.models import Q, Count, Avg, Sum, F, Prefetch
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.conf import settings
+from django.core.cache import cache
 from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
 from django_filters.rest_framework import DjangoFilterBackend
@@ -30,9 +34,10 @@ from .serializers import (
     AcknowledgmentSerializer, DashboardMetricsSerializer,
     RouteSessionSerializer, RouteTrackingSerializer,
     RouteSessionCreateSerializer, RouteSessionStopSerializer,
-    CoordinateSerializer, ShipmentEventSerializer,
+    ShipmentEventSerializer,
     RouteOptimizeRequestSerializer, BulkShipmentEventSerializer,
-    ChangeRiderSerializer, BatchChangeRiderSerializer, AcknowledgmentSettingsSerializer
+    ChangeRiderSerializer, BatchChangeRiderSerializer, AcknowledgmentSettingsSerializer,
+    parse_coordinate,
 )
 from .filters import ShipmentFilter
 from utils.pops_client import pops_client, get_user_pops_token
@@ -45,6 +50,64 @@ DELIVERY_ACK_REQUIRED_MESSAGE = (
     "Recipient signature and current shipment photo are required before marking as Delivered or Picked Up."
 )
 SKIPPED_REASON_REQUIRED_MESSAGE = "Reason is required when marking a shipment as Skipped."
+COLLECTED_ON_PICKUP_MESSAGE = (
+    "Use Picked Up for pickup/store-pickup shipments; Collected is for rider collection flow."
+)
+
+# Statuses a shipment's type restricts: status -> (type it must have, type it
+# must not have, rejection message)
+STATUS_TYPE_RULES = {
+    'Delivered': ('delivery', None, 'Cannot mark a pickup shipment as Delivered'),
+    'Picked Up': ('pickup', None, 'Cannot mark a delivery shipment as Picked Up'),
+    'Collected': (None, 'pickup', COLLECTED_ON_PICKUP_MESSAGE),
+}
+
+
+def _status_type_error(status_value, shipment_type):
+    """Rejection message when a shipment of shipment_type can't take status_value, else None"""
+    rule = STATUS_TYPE_RULES.get(status_value)
+    if rule is None:
+        return None
+    required_type, forbidden_type, message = rule
+    if (required_type and shipment_type != required_type) or (forbidden_type and shipment_type == forbidden_type):
+        return message
+    return None
+
+# Request keys accepted by the shipment tracking endpoint -> Shipment fields
+TRACKING_FIELD_MAP = {
+    'start_latitude': 'start_latitude',
+    'start_longitude': 'start_longitude',
+    'stop_latitude': 'stop_latitude',
+    'stop_longitude': 'stop_longitude',
+    'km_travelled': 'km_travelled',
+    'status': 'status',
+    'actualDeliveryTime': 'actual_delivery_time',
+}
+# Request values needing conversion; an unparseable delivery time means "now"
+TRACKING_FIELD_CONVERTERS = {
+    'actualDeliveryTime': lambda value: (
+        (parse_datetime(value) or timezone.now()) if isinstance(value, str) else value
+    ),
+}
+
+# Columns ShipmentSerializer renders; list reads leave the rest unloaded
+SHIPMENT_LIST_ONLY_FIELDS = tuple(
+    field.name for field in Shipment._meta.concrete_fields
+    if field.name in ShipmentSerializer.Meta.fields
+)
+
+# Paging through fetch repeats the same COUNT(*) for every page; reuse it briefly
+FETCH_COUNT_CACHE_TTL = 30
+
+
+def _fetch_count_cache_key(user, query_params):
+    """Count cache key for one user's view of one filter set (paging params excluded)"""
+    filters = sorted(
+        (key, tuple(values)) for key, values in query_params.lists()
+        if key not in ('page', 'limit', 'exact_count')
+    )
+    digest = hashlib.md5(repr(filters).encode()).hexdigest()
+    return f"shipments_fetch_count:{user.pk}:{digest}"
 
 
 def _extract_pincode(address):
@@ -165,6 +228,25 @@ def _has_required_acknowledgment(shipment):
     return bool(signature_url or photo_url)
 
 
+
+def _encode_fetch_cursor(shipment):
+    """Opaque keyset cursor pointing just past shipment in (-created_at, -id) order"""
+    raw = f"{shipment.created_at.isoformat()}|{shipment.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_fetch_cursor(cursor):
+    """Return (created_at, id) from a fetch cursor, or None if it is malformed"""
+    try:
+        created_at, _, pk = base64.urlsafe_b64decode(cursor.encode()).decode().partition('|')
+        created_at = parse_datetime(created_at)
+        pk = int(pk)
+    except (ValueError, UnicodeError):
+        return None
+    if created_at is None:
+        return None
+    return created_at, pk
+
 class ShipmentViewSet(viewsets.ModelViewSet):
     # Order matters: MultiPart first for files, JSON for standard updates
     parser_classes = (MultiPartParser, FormParser, JSONParser)
@@ -234,7 +316,11 @@ class ShipmentViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         """Filter shipments based on user role"""
-        queryset = super().get_queryset()
+        queryset = super().get_queryset().annotate(
+            _addr_display=ShipmentSerializer.address_display_expression()
+        )
+        if self.action in ('list', 'fetch'):
+            queryset = queryset.only(*SHIPMENT_LIST_ONLY_FIELDS)
         user = self.request.user
         
         # Admins, managers, ops team see all shipments
@@ -348,24 +434,8 @@ class ShipmentViewSet(viewsets.ModelViewSet):
         # For relative paths like "/media/photos/...", build an absolute URL
         return request.build_absolute_uri(url)
 
-    def _sync_shipment_to_pops(self, shipment, request):
-        """
-        Sync shipment updates to POPS for rider/status/route/remarks/ack artifacts.
-        """
-        if not shipment.pops_order_id:
-            return False
-
-        access_token = self._resolve_pops_token(request)
-        if not access_token:
-            logger.warning("POPS sync skipped: missing access token for shipment %s", shipment.id)
-            shipment.sync_status = 'failed'
-            shipment.sync_error = 'Missing POPS access token'
-            shipment.sync_attempts += 1
-            shipment.last_sync_attempt = timezone.now()
-            shipment.save(update_fields=['sync_status', 'sync_error', 'sync_attempts', 'last_sync_attempt', 'updated_at'])
-            return False
-
-        # Map RiderPro fields to POPS Order fields.
+    def _pops_sync_payload(self, shipment, request):
+        """Map RiderPro fields to POPS Order fields."""
         payload = {}
         if shipment.status is not None:
             payload['status'] = shipment.status
@@ -396,7 +466,59 @@ class ShipmentViewSet(viewsets.ModelViewSet):
                 'source': 'riderpro',
                 'riderpro_acknowledgment': ack_artifacts,
             }
+        return payload
+
+    def _resolve_pops_sync_token(self, shipment, request):
+        """
+        POPS token for syncing shipment; when there is none the failure is
+        recorded on the shipment and None is returned.
+        """
+        access_token = self._resolve_pops_token(request)
+        if not access_token:
+            logger.warning("POPS sync skipped: missing access token for shipment %s", shipment.id)
+            shipment.sync_status = 'failed'
+            shipment.sync_error = 'Missing POPS access token'
+            shipment.sync_attempts += 1
+            shipment.last_sync_attempt = timezone.now()
+            shipment.save(update_fields=['sync_status', 'sync_error', 'sync_attempts', 'last_sync_attempt', 'updated_at'])
+        return access_token
+
+    def _queue_shipments_sync_to_pops(self, shipments, request):
+        """
+        Sync shipment updates to POPS once the request's transaction commits,
+        without holding the response for the POPS round trip. All shipments go
+        out as one background job.
+        """
+        syncs = []
+        for shipment in shipments:
+            if not shipment.pops_order_id:
+                continue
+
+            access_token = self._resolve_pops_sync_token(shipment, request)
+            if not access_token:
+                continue
+
+            payload = self._pops_sync_payload(shipment, request)
+            if payload:
+                syncs.append((shipment.id, shipment.pops_order_id, payload, access_token))
+
+        if syncs:
+            from .services import ShipmentStatusService
+            ShipmentStatusService.queue_fields_syncs_to_pops(syncs)
+
+    def _sync_shipment_to_pops(self, shipment, request):
+        """
+        Sync shipment updates to POPS for rider/status/route/remarks/ack artifacts.
+        Blocks on POPS; used where the response reports whether the sync succeeded.
+        """
+        if not shipment.pops_order_id:
+            return False
+
+        access_token = self._resolve_pops_sync_token(shipment, request)
+        if not access_token:
+            return False
 
+        payload = self._pops_sync_payload(shipment, request)
         if not payload:
             return False
 
@@ -435,7 +557,7 @@ class ShipmentViewSet(viewsets.ModelViewSet):
         shipment = serializer.save()
         
         # Sync to POPS when order mapping is available
-        self._sync_shipment_to_pops(shipment, request)
+        self._queue_shipments_sync_to_pops([shipment], request)
         
         return Response(
             ShipmentSerializer(shipment).data,
@@ -472,7 +594,7 @@ class ShipmentViewSet(viewsets.ModelViewSet):
             )
         if requested_status == 'Collected' and instance.type == 'pickup':
             return Response(
-                {'success': False, 'message': 'Use Picked Up for pickup/store-pickup shipments; Collected is for rider collection flow.'},
+                {'success': False, 'message': COLLECTED_ON_PICKUP_MESSAGE},
                 status=status.HTTP_400_BAD_REQUEST
             )
         if (
@@ -494,12 +616,8 @@ class ShipmentViewSet(viewsets.ModelViewSet):
         serializer.is_valid(raise_exception=True)
         old_employee_id = instance.employee_id
         
-        # Reset sync status when updating
-        shipment = serializer.save()
-        shipment.synced_to_external = False
-        shipment.sync_status = 'pending'
-        shipment.sync_attempts = 0
-        shipment.save()
+        # Reset sync status in the same save as the update
+        shipment = serializer.save(synced_to_external=False, sync_status='pending', sync_attempts=0)
         
         # If employee_id changed, create assignment event
         if 'employee_id' in request.data and request.data['employee_id'] != old_employee_id:
@@ -516,7 +634,7 @@ class ShipmentViewSet(viewsets.ModelViewSet):
             )
         
         # Sync full mutable payload to POPS (status/rider/route/remarks/ack artifacts)
-        self._sync_shipment_to_pops(shipment, request)
+        self._queue_shipments_sync_to_pops([shipment], request)
         
         return Response(ShipmentSerializer(shipment).data)
     
@@ -576,19 +694,10 @@ class ShipmentViewSet(viewsets.ModelViewSet):
             )
         
         # Validate status based on shipment type
-        if status_value == 'Delivered' and shipment.type != 'delivery':
-            return Response(
-                {'message': 'Cannot mark a pickup shipment as Delivered'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        if status_value == 'Picked Up' and shipment.type != 'pickup':
-            return Response(
-                {'message': 'Cannot mark a delivery shipment as Picked Up'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        if status_value == 'Collected' and shipment.type == 'pickup':
+        type_error = _status_type_error(status_value, shipment.type)
+        if type_error:
             return Response(
-                {'message': 'Use Picked Up for pickup/store-pickup shipments; Collected is for rider collection flow.'},
+                {'message': type_error},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
@@ -613,8 +722,8 @@ class ShipmentViewSet(viewsets.ModelViewSet):
             sync_to_pops=False
         )
         shipment.remarks = remarks
-        shipment.save()
-        self._sync_shipment_to_pops(shipment, request)
+        shipment.save(update_fields=['remarks', 'updated_at'])
+        self._queue_shipments_sync_to_pops([shipment], request)
         
         return Response({
             'success': True,
@@ -660,30 +769,11 @@ class ShipmentViewSet(viewsets.ModelViewSet):
         """Update shipment tracking data - matches /api/shipments/:id/tracking"""
         shipment = self.get_object()
         
-        # Allowed tracking fields
-        allowed_fields = {
-            'start_latitude': 'start_latitude',
-            'start_longitude': 'start_longitude',
-            'stop_latitude': 'stop_latitude',
-            'stop_longitude': 'stop_longitude',
-            'km_travelled': 'km_travelled',
-            'status': 'status',
-            'actualDeliveryTime': 'actual_delivery_time'
+        updates = {
+            TRACKING_FIELD_MAP[key]: TRACKING_FIELD_CONVERTERS.get(key, lambda value: value)(request.data[key])
+            for key in TRACKING_FIELD_MAP.keys() & request.data.keys()
         }
         
-        updates = {}
-        for field, db_field in allowed_fields.items():
-            if field in request.data:
-                if field == 'actualDeliveryTime':
-                    from django.utils.dateparse import parse_datetime
-                    value = request.data[field]
-                    if isinstance(value, str):
-                        updates[db_field] = parse_datetime(value) or timezone.now()
-                    else:
-                        updates[db_field] = value
-                else:
-                    updates[db_field] = request.data[field]
-        
         if not updates:
             return Response(
                 {'success': False, 'message': 'No valid tracking fields provided'},
@@ -696,7 +786,7 @@ class ShipmentViewSet(viewsets.ModelViewSet):
         
         shipment.synced_to_external = False
         shipment.sync_status = 'pending'
-        shipment.save()
+        shipment.save(update_fields=[*updates, 'synced_to_external', 'sync_status', 'updated_at'])
         
         return Response({
             'success': True,
@@ -708,9 +798,10 @@ class ShipmentViewSet(viewsets.ModelViewSet):
         """Delete shipment - matches DELETE /api/shipments/:id"""
         shipment = self.get_object()
         
-        # For now, mark as deleted rather than actually deleting
+        # For now, mark as deleted rather than actually deleting. Only the status
+        # is written; the save still sends the partner's status callback.
         shipment.status = 'Deleted'
-        shipment.save()
+        shipment.save(update_fields=['status', 'updated_at'])
         
         return Response({
             'message': 'Shipment deleted successfully',
@@ -870,16 +961,21 @@ class ShipmentViewSet(viewsets.ModelViewSet):
             acknowledgment.save()
         
         # Update shipment
+        ack_fields = [
+            'signature_url', 'photo_url',
+            'acknowledgment_captured_at', 'acknowledgment_captured_by', 'updated_at',
+        ]
         shipment.signature_url = acknowledgment.signature_url
         shipment.photo_url = acknowledgment.photo_url
         if signed_pdf_url:
             shipment.signed_pdf_url = signed_pdf_url
+            ack_fields.append('signed_pdf_url')
         shipment.acknowledgment_captured_at = acknowledgment.acknowledgment_captured_at
         shipment.acknowledgment_captured_by = acknowledgment.acknowledgment_captured_by
-        shipment.save()
+        shipment.save(update_fields=ack_fields)
         
         # Sync to POPS
-        self._sync_shipment_to_pops(shipment, request)
+        self._queue_shipments_sync_to_pops([shipment], request)
         
         return Response({
             'success': True,
@@ -1387,6 +1483,9 @@ class ShipmentViewSet(viewsets.ModelViewSet):
         results = []
         is_manager = _is_manager_user(request.user)
         processed_ids = set()
+        # First pass: reject malformed and duplicate entries, keeping a result
+        # slot for each remaining one so results follow the request order
+        entries = []
         for update_data in updates:
             if not isinstance(update_data, dict):
                 failed_count += 1
@@ -1416,100 +1515,127 @@ class ShipmentViewSet(viewsets.ModelViewSet):
                 })
                 continue
             processed_ids.add(shipment_key)
-            
             try:
-                # Scope by the per-driver queryset so a driver can only batch-update
-                # THEIR own shipments (managers still see all). Prevents IDOR (#5).
-                shipment = self.get_queryset().get(id=shipment_id)
-                requested_status = update_data.get('status')
-                if not requested_status:
-                    failed_count += 1
-                    results.append({
-                        'shipment_id': shipment_id,
-                        'success': False,
-                        'message': 'Status is required.'
-                    })
-                    continue
-                if requested_status == 'Delivered' and shipment.type != 'delivery':
-                    failed_count += 1
-                    results.append({
-                        'shipment_id': shipment_id,
-                        'success': False,
-                        'message': 'Cannot mark a pickup shipment as Delivered'
-                    })
-                    continue
-                if requested_status == 'Picked Up' and shipment.type != 'pickup':
-                    failed_count += 1
-                    results.append({
-                        'shipment_id': shipment_id,
-                        'success': False,
-                        'message': 'Cannot mark a delivery shipment as Picked Up'
-                    })
-                    continue
-                if requested_status == 'Collected' and shipment.type == 'pickup':
-                    failed_count += 1
-                    results.append({
-                        'shipment_id': shipment_id,
-                        'success': False,
-                        'message': 'Use Picked Up for pickup/store-pickup shipments; Collected is for rider collection flow.'
-                    })
-                    continue
-                if requested_status == shipment.status:
-                    skipped_count += 1
-                    results.append({
-                        'shipment_id': shipment_id,
-                        'success': True,
-                        'message': f'No update required. Shipment already {shipment.status}.'
-                    })
-                    continue
-                if (
-                    requested_status in ACK_REQUIRED_STATUS_VALUES
-                    and not is_manager
-                    and not _has_required_acknowledgment(shipment)
-                ):
-                    failed_count += 1
-                    results.append({
-                        'shipment_id': shipment_id,
-                        'success': False,
-                        'message': DELIVERY_ACK_REQUIRED_MESSAGE
-                    })
-                    continue
-                if (
-                    requested_status == 'Skipped'
-                    and not str(update_data.get('remarks', '')).strip()
-                ):
-                    failed_count += 1
-                    results.append({
-                        'shipment_id': shipment_id,
-                        'success': False,
-                        'message': SKIPPED_REASON_REQUIRED_MESSAGE
-                    })
-                    continue
+                pk = int(shipment_id)
+            except (TypeError, ValueError):
+                pk = None
+            entries.append((len(results), shipment_id, pk, update_data))
+            results.append(None)
+
+        # Load every row in one query. Scope by the per-driver queryset so a driver
+        # can only batch-update THEIR own shipments (managers still see all).
+        # Prevents IDOR (#5).
+        shipments_by_id = {
+            shipment.id: shipment
+            for shipment in self.get_queryset().select_related('acknowledgment').filter(
+                id__in={pk for _, _, pk, _ in entries if pk is not None}
+            )
+        }
 
-                serializer = ShipmentUpdateSerializer(shipment, data=update_data, partial=True)
-                if serializer.is_valid():
-                    shipment = serializer.save()
-                    shipment.synced_to_external = False
-                    shipment.sync_status = 'pending'
-                    shipment.save()
-                    self._sync_shipment_to_pops(shipment, request)
-                    updated_count += 1
-                    results.append({
-                        'shipment_id': shipment_id,
-                        'success': True,
-                        'message': f'Status updated to {shipment.status}'
-                    })
-                else:
-                    failed_count += 1
-                    results.append({
-                        'shipment_id': shipment_id,
-                        'success': False,
-                        'message': serializer.errors
-                    })
-            except Shipment.DoesNotExist:
+        pending = []
+        # Rows grouped by the columns they change, so each row only writes the
+        # fields its own update sent
+        pending_by_fields = defaultdict(list)
+        old_statuses = {}
+        for slot, shipment_id, pk, update_data in entries:
+            shipment = shipments_by_id.get(pk)
+            if shipment is None:
                 failed_count += 1
-                results.append({'shipment_id': shipment_id, 'success': False, 'message': 'Shipment not found'})
+                results[slot] = {'shipment_id': shipment_id, 'success': False, 'message': 'Shipment not found'}
+                continue
+            requested_status = update_data.get('status')
+            if not requested_status:
+                failed_count += 1
+                results[slot] = {
+                    'shipment_id': shipment_id,
+                    'success': False,
+                    'message': 'Status is required.'
+                }
+                continue
+            type_error = _status_type_error(requested_status, shipment.type)
+            if type_error:
+                failed_count += 1
+                results[slot] = {
+                    'shipment_id': shipment_id,
+                    'success': False,
+                    'message': type_error
+                }
+                continue
+            if requested_status == shipment.status:
+                skipped_count += 1
+                results[slot] = {
+                    'shipment_id': shipment_id,
+                    'success': True,
+                    'message': f'No update required. Shipment already {shipment.status}.'
+                }
+                continue
+            if (
+                requested_status in ACK_REQUIRED_STATUS_VALUES
+                and not is_manager
+                and not _has_required_acknowledgment(shipment)
+            ):
+                failed_count += 1
+                results[slot] = {
+                    'shipment_id': shipment_id,
+                    'success': False,
+                    'message': DELIVERY_ACK_REQUIRED_MESSAGE
+                }
+                continue
+            if (
+                requested_status == 'Skipped'
+                and not str(update_data.get('remarks', '')).strip()
+            ):
+                failed_count += 1
+                results[slot] = {
+                    'shipment_id': shipment_id,
+                    'success': False,
+                    'message': SKIPPED_REASON_REQUIRED_MESSAGE
+                }
+                continue
+
+            serializer = ShipmentUpdateSerializer(shipment, data=update_data, partial=True)
+            if not serializer.is_valid():
+                failed_count += 1
+                results[slot] = {
+                    'shipment_id': shipment_id,
+                    'success': False,
+                    'message': serializer.errors
+                }
                 continue
+
+            # Apply in memory; accepted rows are written by one bulk_update per field set below
+            old_statuses[shipment.id] = shipment.status
+            for field, value in serializer.validated_data.items():
+                setattr(shipment, field, value)
+            shipment.synced_to_external = False
+            shipment.sync_status = 'pending'
+            pending.append(shipment)
+            pending_by_fields[tuple(sorted(
+                set(serializer.validated_data) | {'synced_to_external', 'sync_status', 'updated_at'}
+            ))].append(shipment)
+            updated_count += 1
+            results[slot] = {
+                'shipment_id': shipment_id,
+                'success': True,
+                'message': f'Status updated to {shipment.status}'
+            }
+
+        if pending:
+            from .signals import queue_status_change_callbacks
+
+            now = timezone.now()
+            for shipment in pending:
+                shipment.updated_at = now
+            # All field groups commit together; callbacks and POPS syncs are
+            # queued on that commit
+            with transaction.atomic():
+                for fields, shipments in pending_by_fields.items():
+                    Shipment.objects.bulk_update(shipments, fields, batch_size=500)
+                for shipment in pending:
+                    shipment._loaded_status = shipment.status
+                # bulk_update skips post_save; queue the status callbacks it would send
+                queue_status_change_callbacks(pending, old_statuses)
+                self._queue_shipments_sync_to_pops(pending, request)
         
         return Response({
             'success': updated_count > 0,
@@ -1525,7 +1651,23 @@ class ShipmentViewSet(viewsets.ModelViewSet):
     
     @action(detail=False, methods=['get'])
     def fetch(self, request):
-        """Fetch shipments with filters and pagination (matches Node.js endpoint)"""
+        """
+        Fetch shipments with filters and pagination (matches Node.js endpoint).
+        The total behind the X-Total-* headers is cached for FETCH_COUNT_CACHE_TTL
+        seconds per user and filter set; `exact_count=true` recounts.
+        Passing `cursor` (empty for the first page) switches to keyset pagination
+        in newest-first order: pages cost the same at any depth, the next page's
+        cursor comes back in X-Next-Cursor and no totals are counted. `cursor`
+        can't be combined with `ordering`.
+        """
+        if 'cursor' in request.query_params:
+            if request.query_params.get('ordering'):
+                return Response(
+                    {'error': 'cursor cannot be combined with ordering'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            return self._fetch_after_cursor(self.filter_queryset(self.get_queryset()), request)
+
         queryset = self.filter_queryset(self.get_queryset())
         
         # Pagination
@@ -1536,7 +1678,12 @@ class ShipmentViewSet(viewsets.ModelViewSet):
         start = (page - 1) * limit
         end = start + limit
         
-        total = queryset.count()
+        count_key = _fetch_count_cache_key(request.user, request.query_params)
+        if request.query_params.get('exact_count') == 'true':
+            total = queryset.count()
+            cache.set(count_key, total, FETCH_COUNT_CACHE_TTL)
+        else:
+            total = cache.get_or_set(count_key, queryset.count, FETCH_COUNT_CACHE_TTL)
         shipments = queryset[start:end]
         
         serializer = self.get_serializer(shipments, many=True)
@@ -1550,7 +1697,35 @@ class ShipmentViewSet(viewsets.ModelViewSet):
         response['X-Has-Previous-Page'] = str(page > 1).lower()
         
         return response
-
+    
+    def _fetch_after_cursor(self, queryset, request):
+        """Keyset page of fetch: rows strictly after the cursor's (created_at, id)"""
+        limit = min(100, max(1, int(request.query_params.get('limit', 20))))
+        queryset = queryset.order_by('-created_at', '-id')
+        cursor = request.query_params.get('cursor')
+        if cursor:
+            position = _decode_fetch_cursor(cursor)
+            if position is None:
+                return Response(
+                    {'error': 'Invalid cursor'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            created_at, pk = position
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+            )
+        
+        # One extra row tells whether another page follows
+        shipments = list(queryset[:limit + 1])
+        has_next = len(shipments) > limit
+        shipments = shipments[:limit]
+        
+        response = Response(self.get_serializer(shipments, many=True).data)
+        response['X-Per-Page'] = limit
+        response['X-Has-Next-Page'] = str(has_next).lower()
+        if has_next:
+            response['X-Next-Cursor'] = _encode_fetch_cursor(shipments[-1])
+        return response
 
 class DashboardViewSet(viewsets.ViewSet):
     """Dashboard metrics viewset"""
@@ -1570,33 +1745,30 @@ class DashboardViewSet(viewsets.ViewSet):
         if not (user.is_superuser or user.is_ops_team or user.is_staff):
             queryset = queryset.filter(employee_id=user.employee_id)
         
-        total = queryset.count()
-        pending = queryset.filter(status='Assigned').count()
-        in_transit = queryset.filter(status='In Transit').count()
-        collected = queryset.filter(status='Collected').count()
-        delivered = queryset.filter(status='Delivered').count()
-        picked_up = queryset.filter(status='Picked Up').count()
-        returned = queryset.filter(status='Returned').count()
-        cancelled = queryset.filter(status='Cancelled').count()
-        
-        # In Progress metric: Collected + In Transit
-        in_progress = queryset.filter(status__in=['Collected', 'In Transit']).count()
-        
-        # Calculate revenue (sum of costs for delivered/picked up)
-        completed = queryset.filter(status__in=['Delivered', 'Picked Up'])
-        total_revenue = completed.aggregate(total=Sum('cost'))['total'] or 0
-        
-        # Calculate average delivery time
-        completed_with_time = completed.exclude(actual_delivery_time__isnull=True)
-        if completed_with_time.exists():
-            avg_time = completed_with_time.aggregate(
-                avg=Avg(
-                    F('actual_delivery_time') - F('delivery_time')
-                )
-            )['avg']
-            avg_delivery_time = avg_time.total_seconds() / 3600 if avg_time else 0
-        else:
-            avg_delivery_time = 0
+        # One pass over today's rows for every counter, the revenue and the
+        # average delivery time
+        completed = Q(status__in=['Delivered', 'Picked Up'])
+        totals = queryset.aggregate(
+            total=Count('id'),
+            pending=Count('id', filter=Q(status='Assigned')),
+            in_transit=Count('id', filter=Q(status='In Transit')),
+            collected=Count('id', filter=Q(status='Collected')),
+            delivered=Count('id', filter=Q(status='Delivered')),
+            picked_up=Count('id', filter=Q(status='Picked Up')),
+            returned=Count('id', filter=Q(status='Returned')),
+            cancelled=Count('id', filter=Q(status='Cancelled')),
+            # In Progress metric: Collected + In Transit
+            in_progress=Count('id', filter=Q(status__in=['Collected', 'In Transit'])),
+            # Revenue: sum of costs for delivered/picked up
+            total_revenue=Sum('cost', filter=completed),
+            avg_delivery=Avg(
+                F('actual_delivery_time') - F('delivery_time'),
+                filter=completed & Q(actual_delivery_time__isnull=False)
+            ),
+        )
+        total_revenue = totals['total_revenue'] or 0
+        avg_time = totals['avg_delivery']
+        avg_delivery_time = avg_time.total_seconds() / 3600 if avg_time else 0
         
         # Calculate status breakdown
         status_breakdown = dict(
@@ -1626,15 +1798,15 @@ class DashboardViewSet(viewsets.ViewSet):
         }
         
         metrics = {
-            'total_shipments': total,
-            'pending_shipments': pending,
-            'in_transit_shipments': in_transit,
-            'collected_shipments': collected,
-            'in_progress_shipments': in_progress,
-            'delivered_shipments': delivered,
-            'picked_up_shipments': picked_up,
-            'returned_shipments': returned,
-            'cancelled_shipments': cancelled,
+            'total_shipments': totals['total'],
+            'pending_shipments': totals['pending'],
+            'in_transit_shipments': totals['in_transit'],
+            'collected_shipments': totals['collected'],
+            'in_progress_shipments': totals['in_progress'],
+            'delivered_shipments': totals['delivered'],
+            'picked_up_shipments': totals['picked_up'],
+            'returned_shipments': totals['returned'],
+            'cancelled_shipments': totals['cancelled'],
             'total_revenue': total_revenue,
             'average_delivery_time': avg_delivery_time,
             'status_breakdown': status_breakdown,
@@ -1662,7 +1834,9 @@ class RouteSessionViewSet(viewsets.ModelViewSet):
             if user.employee_id:
                 queryset = queryset.filter(employee_id=user.employee_id)
         
-        return queryset.order_by('-start_time')
+        return queryset.prefetch_related(
+            RouteSessionSerializer.tracking_points_prefetch()
+        ).order_by('-start_time')
 
     @staticmethod
     def _resolve_employee_name_map(employee_ids):
@@ -1670,39 +1844,8 @@ class RouteSessionViewSet(viewsets.ModelViewSet):
         Resolve display names for employee IDs from rider/user tables.
         Falls back to employee ID when no display name is available.
         """
-        if not employee_ids:
-            return {}
-
-        employee_names = {}
-        try:
-            from apps.authentication.models import RiderAccount, User
-
-            riders = RiderAccount.objects.filter(
-                rider_id__in=employee_ids
-            ).values('rider_id', 'name')
-            for rider in riders:
-                if rider.get('name'):
-                    employee_names[rider['rider_id']] = rider['name']
-
-            users = User.objects.filter(
-                employee_id__in=employee_ids
-            ).values('employee_id', 'full_name', 'first_name', 'last_name', 'username')
-            for user in users:
-                employee_id = user.get('employee_id')
-                if not employee_id or employee_id in employee_names:
-                    continue
-
-                full_name = (
-                    user.get('full_name')
-                    or f"{user.get('first_name', '').strip()} {user.get('last_name', '').strip()}".strip()
-                    or user.get('username')
-                )
-                if full_name:
-                    employee_names[employee_id] = full_name
-        except Exception as exc:
-            logger.warning("Failed resolving employee display names: %s", exc)
-
-        return employee_names
+        from .services import resolve_employee_name_map
+        return resolve_employee_name_map(employee_ids)
     
     @action(detail=False, methods=['post'])
     def start(self, request):
@@ -1731,18 +1874,16 @@ class RouteSessionViewSet(viewsets.ModelViewSet):
 
         # Automatically transition all 'Collected' shipments to 'In Transit'
         from .services import ShipmentStatusService
-        collected_shipments = Shipment.objects.filter(
+        collected_shipments = list(Shipment.objects.filter(
             employee_id=user.employee_id,
             status='Collected'
+        ))
+        ShipmentStatusService.update_status_bulk(
+            collected_shipments,
+            new_status='In Transit',
+            triggered_by=f"route-start-{session_id}"
         )
-        transitioned_count = 0
-        for shipment in collected_shipments:
-            ShipmentStatusService.update_status(
-                shipment=shipment,
-                new_status='In Transit',
-                triggered_by=f"route-start-{session_id}"
-            )
-            transitioned_count += 1
+        transitioned_count = len(collected_shipments)
 
         logger.info(
             "Route session started: %s by %s. %d collected shipments moved to In Transit.",
@@ -1817,8 +1958,7 @@ class RouteSessionViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['post'])
     def coordinates(self, request):
         """Submit GPS coordinates"""
-        serializer = CoordinateSerializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
+        coordinate = parse_coordinate(request.data)
         
         user = request.user
         if not user.employee_id:
@@ -1829,7 +1969,7 @@ class RouteSessionViewSet(viewsets.ModelViewSet):
         
         try:
             session = RouteSession.objects.get(
-                id=serializer.validated_data['session_id'],
+                id=coordinate.session_id,
                 employee_id=user.employee_id
             )
         except RouteSession.DoesNotExist:
@@ -1841,11 +1981,11 @@ class RouteSessionViewSet(viewsets.ModelViewSet):
         tracking = RouteTracking.objects.create(
             session=session,
             employee_id=user.employee_id,
-            latitude=serializer.validated_data['latitude'],
-            longitude=serializer.validated_data['longitude'],
-            timestamp=serializer.validated_data.get('timestamp') or timezone.now(),
-            accuracy=serializer.validated_data.get('accuracy'),
-            speed=serializer.validated_data.get('speed'),
+            latitude=coordinate.latitude,
+            longitude=coordinate.longitude,
+            timestamp=coordinate.timestamp or timezone.now(),
+            accuracy=coordinate.accuracy,
+            speed=coordinate.speed,
             event_type='gps'
         )
         
@@ -1872,42 +2012,55 @@ class RouteSessionViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_401_UNAUTHORIZED
             )
         
+        # Validate everything first, keeping each coordinate's slot in results
         results = []
+        parsed = []
         for coord_data in coordinates:
-            serializer = CoordinateSerializer(data=coord_data)
-            if serializer.is_valid():
-                try:
-                    session = RouteSession.objects.get(
-                        id=serializer.validated_data['session_id'],
-                        employee_id=user.employee_id
-                    )
-                    tracking = RouteTracking.objects.create(
-                        session=session,
-                        employee_id=user.employee_id,
-                        latitude=serializer.validated_data['latitude'],
-                        longitude=serializer.validated_data['longitude'],
-                        timestamp=serializer.validated_data.get('timestamp') or timezone.now(),
-                        accuracy=serializer.validated_data.get('accuracy'),
-                        speed=serializer.validated_data.get('speed')
-                    )
-                    results.append({
-                        'success': True,
-                        'record': RouteTrackingSerializer(tracking).data
-                    })
-                except RouteSession.DoesNotExist:
-                    results.append({
-                        'success': False,
-                        'error': 'Session not found'
-                    })
-            else:
+            try:
+                coordinate = parse_coordinate(coord_data)
+            except ValidationError as e:
                 results.append({
                     'success': False,
-                    'error': serializer.errors
+                    'error': e.detail
                 })
+                continue
+            parsed.append((len(results), coordinate))
+            results.append(None)
+
+        # One lookup for the rider's sessions and one INSERT for all points
+        own_session_ids = set(RouteSession.objects.filter(
+            id__in={coordinate.session_id for _, coordinate in parsed},
+            employee_id=user.employee_id
+        ).values_list('id', flat=True))
+        now = timezone.now()
+        pending = []
+        for index, coordinate in parsed:
+            if coordinate.session_id not in own_session_ids:
+                results[index] = {
+                    'success': False,
+                    'error': 'Session not found'
+                }
+                continue
+            pending.append((index, RouteTracking(
+                session_id=coordinate.session_id,
+                employee_id=user.employee_id,
+                latitude=coordinate.latitude,
+                longitude=coordinate.longitude,
+                timestamp=coordinate.timestamp or now,
+                accuracy=coordinate.accuracy,
+                speed=coordinate.speed
+            )))
+        if pending:
+            RouteTracking.objects.bulk_create([tracking for _, tracking in pending], batch_size=500)
+        # Clients only read success/error per coordinate, so stored points are
+        # not echoed back; the summary carries the counts
+        for index, _ in pending:
+            results[index] = {'success': True}
         
         return Response({
             'success': True,
             'results': results,
+            'summary': {'total': len(results), 'successful': len(pending), 'failed': len(results) - len(pending)},
             'message': f'Processed {len(results)} coordinates'
         })
     
@@ -1938,27 +2091,27 @@ class RouteSessionViewSet(viewsets.ModelViewSet):
         event_type = serializer.validated_data['event_type']
         shipment_id = serializer.validated_data['shipment_id']
 
+        # One read serves the ownership check, the acknowledgment check and the
+        # status update below
+        shipment = Shipment.objects.filter(id=shipment_id).first()
+
         # Prevent a driver from recording events / driving status on another rider's
         # shipment (IDOR #5) — mirrors the bulk_shipment_event ownership check
         # (managers bypass; unassigned or own shipments allowed).
         if not _is_manager_user(user):
-            _evt_shipment = Shipment.objects.filter(id=shipment_id).first()
             if (
-                _evt_shipment
-                and _evt_shipment.employee_id
+                shipment
+                and shipment.employee_id
                 and user.employee_id
-                and _evt_shipment.employee_id.lower() != str(user.employee_id).lower()
+                and shipment.employee_id.lower() != str(user.employee_id).lower()
             ):
                 return Response(
                     {'success': False, 'message': 'Shipment is not assigned to this rider.'},
                     status=status.HTTP_403_FORBIDDEN
                 )
 
-        shipment = None
         if event_type in ACK_REQUIRED_EVENT_TYPES:
-            try:
-                shipment = Shipment.objects.get(id=shipment_id)
-            except Shipment.DoesNotExist:
+            if shipment is None:
                 return Response(
                     {'success': False, 'message': 'Shipment not found'},
                     status=status.HTTP_404_NOT_FOUND
@@ -1971,26 +2124,25 @@ class RouteSessionViewSet(viewsets.ModelViewSet):
                 )
         
         # Create tracking point for event
+        now = timezone.now()
         tracking = RouteTracking.objects.create(
             session=session,
             employee_id=user.employee_id,
             latitude=serializer.validated_data['latitude'],
             longitude=serializer.validated_data['longitude'],
-            timestamp=timezone.now(),
+            timestamp=now,
             event_type=event_type,
             shipment_id=shipment_id
         )
         
         # Update shipment status if needed using centralized service
-        try:
+        if shipment is not None:
             from .services import ShipmentStatusService
-            if shipment is None:
-                shipment = Shipment.objects.get(id=shipment_id)
             triggered_by = f"{request.user.username or request.user.id}" if hasattr(request, 'user') else 'gps_tracking'
             
             if event_type == 'delivery':
-                shipment.actual_delivery_time = timezone.now()
-                shipment.save()
+                shipment.actual_delivery_time = now
+                shipment.save(update_fields=['actual_delivery_time', 'updated_at'])
                 ShipmentStatusService.update_status(
                     shipment=shipment,
                     new_status='Delivered',
@@ -2007,8 +2159,6 @@ class RouteSessionViewSet(viewsets.ModelViewSet):
                     metadata={'gps_tracking_id': tracking.id},
                     sync_to_pops=True
                 )
-        except Shipment.DoesNotExist:
-            pass
         
         logger.info(f'Shipment event recorded: {event_type} for {shipment_id}')
         
@@ -2052,7 +2202,11 @@ class RouteSessionViewSet(viewsets.ModelViewSet):
         end_date = request.query_params.get('endDate')
         date = request.query_params.get('date')
 
-        sessions_qs = RouteSession.objects.all().prefetch_related('tracking_points')
+        # Order inside the prefetch: ordering session.tracking_points again per
+        # session would bypass the prefetch cache and query once per session
+        sessions_qs = RouteSession.objects.all().prefetch_related(
+            Prefetch('tracking_points', queryset=RouteTracking.objects.order_by('timestamp'))
+        )
 
         if employee_id:
             sessions_qs = sessions_qs.filter(employee_id=employee_id)
@@ -2078,7 +2232,7 @@ class RouteSessionViewSet(viewsets.ModelViewSet):
         for session in sessions:
             employee_name = employee_name_map.get(session.employee_id) or f"Employee {session.employee_id}"
             points = []
-            for point in session.tracking_points.all().order_by('timestamp'):
+            for point in session.tracking_points.all():
                 points.append({
                     'id': str(point.id),
                     'sessionId': session.id,
@@ -2159,10 +2313,8 @@ class RouteSessionViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        from django.utils.dateparse import parse_datetime as _parse_dt
-
         raw_start = request.data.get('start_time')
-        start_time = (_parse_dt(raw_start) if isinstance(raw_start, str) else None) or timezone.now()
+        start_time = (parse_datetime(raw_start) if isinstance(raw_start, str) else None) or timezone.now()
 
         session, created = RouteSession.objects.get_or_create(
             id=session_id,
@@ -2180,7 +2332,7 @@ class RouteSessionViewSet(viewsets.ModelViewSet):
             raw_end = request.data.get('end_time')
             session.end_latitude = request.data.get('end_latitude')
             session.end_longitude = request.data.get('end_longitude')
-            session.end_time = (_parse_dt(raw_end) if isinstance(raw_end, str) else None) or timezone.now()
+            session.end_time = (parse_datetime(raw_end) if isinstance(raw_end, str) else None) or timezone.now()
             session.status = 'completed'
             session.save()
             # Auto-compute distance/fuel for offline-completed sessions too (they
@@ -2231,9 +2383,9 @@ class RouteSessionViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        from django.utils.dateparse import parse_datetime as _parse_dt
-
         results = []
+        pending = []
+        now = timezone.now()
         for coord_data in coordinates:
             lat = coord_data.get('latitude')
             lng = coord_data.get('longitude')
@@ -2242,9 +2394,9 @@ class RouteSessionViewSet(viewsets.ModelViewSet):
                 continue
 
             raw_ts = coord_data.get('timestamp')
-            ts = (_parse_dt(raw_ts) if isinstance(raw_ts, str) else None) or timezone.now()
+            ts = (parse_datetime(raw_ts) if isinstance(raw_ts, str) else None) or now
 
-            tracking = RouteTracking.objects.create(
+            pending.append((len(results), RouteTracking(
                 session=session,
                 employee_id=user.employee_id,
                 latitude=float(lat),
@@ -2252,8 +2404,16 @@ class RouteSessionViewSet(viewsets.ModelViewSet):
                 timestamp=ts,
                 accuracy=coord_data.get('accuracy'),
                 speed=coord_data.get('speed')
-            )
-            results.append({'success': True, **RouteTrackingSerializer(tracking).data})
+            )))
+            results.append(None)
+
+        # The whole offline buffer goes in as one multi-row INSERT
+        if pending:
+            RouteTracking.objects.bulk_create([tracking for _, tracking in pending], batch_size=500)
+        # One serializer renders every echoed point instead of one per point
+        point_serializer = RouteTrackingSerializer()
+        for index, tracking in pending:
+            results[index] = {'success': True, **point_serializer.to_representation(tracking)}
 
         successful = sum(1 for r in results if r.get('success'))
         logger.info(f'Offline coordinates synced for session {session_id}: {successful}/{len(results)}')
@@ -2296,6 +2456,44 @@ class RouteSessionViewSet(viewsets.ModelViewSet):
         speed = request.data.get('speed')
         session_id = request.data.get('session_id')
         
+        # Buffered clients can send several fixes at once: {"points": [...]}
+        points = request.data.get('points')
+        if points is not None:
+            if not isinstance(points, list) or not points:
+                return Response(
+                    {'success': False, 'message': 'Points must be a non-empty array'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            try:
+                parsed = [
+                    {
+                        'latitude': float(point['latitude']),
+                        'longitude': float(point['longitude']),
+                        'accuracy': float(point['accuracy']) if point.get('accuracy') else None,
+                        'speed': float(point['speed']) if point.get('speed') else None,
+                        'timestamp': parse_datetime(point['timestamp']) if point.get('timestamp') else None,
+                    }
+                    for point in points
+                ]
+            except (KeyError, TypeError, ValueError):
+                return Response(
+                    {'success': False, 'message': 'Each point needs numeric latitude and longitude'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            created = location_tracking.track_location_bulk(
+                user.employee_id, parsed, session_id=session_id
+            )
+            if not created:
+                return Response(
+                    {'success': False, 'message': 'Failed to track location'},
+                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                )
+            return Response({
+                'success': True,
+                'locations': RouteTrackingSerializer(created, many=True).data,
+                'message': f'Tracked {len(created)} locations'
+            }, status=status.HTTP_201_CREATED)
+        
         if not latitude or not longitude:
             return Response(
                 {'success': False, 'message': 'Latitude and longitude are required'},
@@ -2358,114 +2556,10 @@ class RouteSessionViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
 
-        active_sessions = list(
-            RouteSession.objects.filter(
-                status='active',
-                current_latitude__isnull=False,
-                current_longitude__isnull=False,
-            ).values(
-                'id',
-                'employee_id',
-                'current_latitude',
-                'current_longitude',
-                'last_updated',
-                'start_time',
-            )
-        )
-
-        if not active_sessions:
-            return Response({
-                'success': True,
-                'riders': [],
-                'locations': [],  # Backward-compatible alias
-                'count': 0,
-            })
-
-        session_ids = [session['id'] for session in active_sessions]
-        employee_ids = [session['employee_id'] for session in active_sessions if session.get('employee_id')]
-        employee_name_map = self._resolve_employee_name_map(employee_ids)
-
-        tracking_points = RouteTracking.objects.filter(
-            session_id__in=session_ids
-        ).values(
-            'session_id',
-            'latitude',
-            'longitude',
-            'timestamp',
-            'event_type',
-            'shipment_id',
-        ).order_by('timestamp')
-
-        route_points_by_session = defaultdict(list)
-        for point in tracking_points:
-            route_points_by_session[point['session_id']].append({
-                'lat': point['latitude'],
-                'lng': point['longitude'],
-                'timestamp': point['timestamp'].isoformat() if point['timestamp'] else None,
-                'event_type': point.get('event_type'),
-                'shipment_id': point.get('shipment_id'),
-            })
-
-        active_drop_statuses = ['Assigned', 'Collected', 'In Transit', 'Picked Up']
-        active_drop_shipments = Shipment.objects.filter(
-            employee_id__in=employee_ids,
-            status__in=active_drop_statuses,
-            latitude__isnull=False,
-            longitude__isnull=False,
-        ).values(
-            'employee_id',
-            'id',
-            'pops_order_id',
-            'status',
-            'type',
-            'latitude',
-            'longitude',
-            'address',
-        )
-
-        drop_points_by_employee = defaultdict(list)
-        for shipment in active_drop_shipments:
-            address_obj = shipment.get('address')
-            if isinstance(address_obj, dict):
-                address_text = (
-                    address_obj.get('formattedAddress')
-                    or address_obj.get('address')
-                    or address_obj.get('displayAddress')
-                    or ''
-                )
-            else:
-                address_text = str(address_obj or '')
-
-            drop_points_by_employee[shipment['employee_id']].append({
-                'id': str(shipment['id']),
-                'shipment_id': str(shipment.get('pops_order_id') or shipment['id']),
-                'status': shipment.get('status'),
-                'type': shipment.get('type'),
-                'lat': shipment['latitude'],
-                'lng': shipment['longitude'],
-                'address': address_text,
-            })
-
-        riders_payload = []
-        for session in active_sessions:
-            employee_id = session.get('employee_id')
-            route_points = route_points_by_session.get(session['id'], [])
-            # Keep payload bounded for real-time polling.
-            if len(route_points) > 300:
-                route_points = route_points[-300:]
-
-            riders_payload.append({
-                'employee_id': employee_id,
-                'employee_name': employee_name_map.get(employee_id) or f'Employee {employee_id}',
-                'latitude': session['current_latitude'],
-                'longitude': session['current_longitude'],
-                'timestamp': session['last_updated'].isoformat() if session['last_updated'] else None,
-                'session_id': session['id'],
-                'start_time': session['start_time'].isoformat() if session['start_time'] else None,
-                'status': 'active',
-                'route': route_points,
-                'drop_points': drop_points_by_employee.get(employee_id, []),
-            })
+        # Every open dashboard polls this; the payload is shared through a
+        # short-lived cache entry
+        from .services import location_tracking
+        riders_payload = location_tracking.get_active_riders_locations()
 
         return Response({
             'success': True,
@@ -2954,15 +3048,18 @@ class RouteSessionViewSet(viewsets.ModelViewSet):
         # Include collected/picked-up states so drop points stay visible after rider actions.
         # When ops has dispatched this rider's route, its stops carry a dispatch_sequence —
         # obey that locked order (nulls last, so not-yet-dispatched stops fall back to
-        # creation order and undispatched days are unchanged).
-        shipments_qs = Shipment.objects.filter(
+        # creation order and undispatched days are unchanged). The rows are read
+        # once and shared by the geocoding pass, the count and the payload.
+        shipments = list(Shipment.objects.filter(
             employee_id__iexact=employee_id,
             status__in=['Assigned', 'Collected', 'In Transit', 'Picked Up']
-        ).order_by(F('dispatch_sequence').asc(nulls_last=True), 'created_at')
+        ).annotate(
+            _addr_display=ShipmentSerializer.address_display_expression()
+        ).order_by(F('dispatch_sequence').asc(nulls_last=True), 'created_at'))
         
         # Geocode any shipment missing lat/long (e.g. customer delivery address when POPS didn't send coords)
         from .geocoding import geocode_address
-        for shipment in shipments_qs:
+        for shipment in shipments:
             if (shipment.latitude is None or shipment.longitude is None) and shipment.address:
                 try:
                     coords = geocode_address(shipment.address)
@@ -2974,8 +3071,8 @@ class RouteSessionViewSet(viewsets.ModelViewSet):
         
         return Response({
             'success': True,
-            'count': shipments_qs.count(),
-            'shipments': ShipmentSerializer(shipments_qs, many=True).data
+            'count': len(shipments),
+            'shipments': ShipmentSerializer(shipments, many=True).data
         })
 
     @action(detail=False, methods=['post'])
@@ -3011,8 +3108,17 @@ class RouteSessionViewSet(viewsets.ModelViewSet):
 
         from .services import ShipmentStatusService
 
+        # Load every referenced shipment in one query instead of one get() per id
+        pk_by_key = {}
+        for shipment_id in shipment_ids:
+            try:
+                pk_by_key[str(shipment_id)] = int(shipment_id)
+            except (TypeError, ValueError):
+                continue
+        shipments_by_pk = Shipment.objects.in_bulk(set(pk_by_key.values()))
+
         results = []
-        success_count = 0
+        accepted = []
         processed_ids = set()
         for shipment_id in shipment_ids:
             shipment_key = str(shipment_id)
@@ -3024,71 +3130,79 @@ class RouteSessionViewSet(viewsets.ModelViewSet):
                 })
                 continue
             processed_ids.add(shipment_key)
-            try:
-                shipment = Shipment.objects.get(id=shipment_id)
-                if (
-                    shipment.employee_id
-                    and user.employee_id
-                    and shipment.employee_id.lower() != user.employee_id.lower()
-                ):
-                    results.append({
-                        'shipment_id': shipment_id,
-                        'success': False,
-                        'message': 'Shipment is not assigned to this rider.'
-                    })
-                    continue
-                if event_type == 'delivery' and shipment.type == 'pickup':
-                    results.append({
-                        'shipment_id': shipment_id,
-                        'success': False,
-                        'message': 'Cannot record delivery event for pickup shipment.'
-                    })
-                    continue
-                if (
-                    event_type in ACK_REQUIRED_EVENT_TYPES
-                    and not is_manager
-                    and not _has_required_acknowledgment(shipment)
-                ):
-                    results.append({
-                        'shipment_id': shipment_id,
-                        'success': False,
-                        'message': DELIVERY_ACK_REQUIRED_MESSAGE
-                    })
-                    continue
-
-                RouteTracking.objects.create(
-                    session=session,
-                    employee_id=user.employee_id,
-                    latitude=lat,
-                    longitude=lng,
-                    timestamp=timezone.now(),
-                    event_type=event_type,
-                    shipment_id=shipment_id
-                )
-
-                if event_type == 'delivery':
-                    shipment.actual_delivery_time = timezone.now()
-                    shipment.save(update_fields=['actual_delivery_time'])
-                    ShipmentStatusService.update_status(
-                        shipment=shipment,
-                        new_status='Delivered',
-                        triggered_by=triggered_by,
-                        metadata={'bulk_event': True},
-                        sync_to_pops=True
-                    )
-                elif event_type == 'pickup':
-                    new_status = 'Picked Up' if shipment.type == 'pickup' else 'Collected'
-                    ShipmentStatusService.update_status(
-                        shipment=shipment,
-                        new_status=new_status,
-                        triggered_by=triggered_by,
-                        metadata={'bulk_event': True},
-                        sync_to_pops=True
-                    )
-                success_count += 1
-                results.append({'shipment_id': shipment_id, 'success': True})
-            except Shipment.DoesNotExist:
+            shipment = shipments_by_pk.get(pk_by_key.get(shipment_key))
+            if shipment is None:
                 results.append({'shipment_id': shipment_id, 'success': False, 'message': 'Not found'})
+                continue
+            if (
+                shipment.employee_id
+                and user.employee_id
+                and shipment.employee_id.lower() != user.employee_id.lower()
+            ):
+                results.append({
+                    'shipment_id': shipment_id,
+                    'success': False,
+                    'message': 'Shipment is not assigned to this rider.'
+                })
+                continue
+            if event_type == 'delivery' and shipment.type == 'pickup':
+                results.append({
+                    'shipment_id': shipment_id,
+                    'success': False,
+                    'message': 'Cannot record delivery event for pickup shipment.'
+                })
+                continue
+            if (
+                event_type in ACK_REQUIRED_EVENT_TYPES
+                and not is_manager
+                and not _has_required_acknowledgment(shipment)
+            ):
+                results.append({
+                    'shipment_id': shipment_id,
+                    'success': False,
+                    'message': DELIVERY_ACK_REQUIRED_MESSAGE
+                })
+                continue
+            accepted.append((shipment_id, shipment))
+            results.append({'shipment_id': shipment_id, 'success': True})
+
+        # All events share one location, so write the tracking rows in a single INSERT
+        now = timezone.now()
+        RouteTracking.objects.bulk_create([
+            RouteTracking(
+                session=session,
+                employee_id=user.employee_id,
+                latitude=lat,
+                longitude=lng,
+                timestamp=now,
+                event_type=event_type,
+                shipment_id=shipment_id
+            )
+            for shipment_id, _ in accepted
+        ], batch_size=500)
+
+        # Group by target status so each group is one UPDATE plus one events INSERT
+        by_status = {}
+        for _, shipment in accepted:
+            if event_type == 'delivery':
+                shipment.actual_delivery_time = now
+                by_status.setdefault('Delivered', []).append(shipment)
+            elif event_type == 'pickup':
+                new_status = 'Picked Up' if shipment.type == 'pickup' else 'Collected'
+                by_status.setdefault(new_status, []).append(shipment)
+        if event_type == 'delivery' and accepted:
+            Shipment.objects.filter(
+                pk__in=[shipment.pk for _, shipment in accepted]
+            ).update(actual_delivery_time=now)
+        for new_status, group in by_status.items():
+            ShipmentStatusService.update_status_bulk(
+                group,
+                new_status,
+                triggered_by=triggered_by,
+                metadata={'bulk_event': True},
+                sync_to_pops=True
+            )
+        success_count = len(accepted)
 
         return Response({
             'success': success_count > 0,
@@ -3149,8 +3263,11 @@ class RouteSessionViewSet(viewsets.ModelViewSet):
             )
         
         try:
-            shipments = Shipment.objects.filter(id__in=shipment_ids)
-            if not shipments.exists():
+            # One read serves the emptiness check, the URL and the count
+            shipments = list(Shipment.objects.filter(id__in=shipment_ids).values_list(
+                'id', 'latitude', 'longitude', 'pickup_address', named=True
+            ))
+            if not shipments:
                 return Response(
                     {'error': 'No shipments found'},
                     status=status.HTTP_404_NOT_FOUND
@@ -3163,7 +3280,7 @@ class RouteSessionViewSet(viewsets.ModelViewSet):
                 start_tuple = (start_location.get('latitude'), start_location.get('longitude'))
             
             url = RoutePlanningService.generate_google_maps_url(
-                shipments=list(shipments),
+                shipments=shipments,
                 start_location=start_tuple,
                 optimize=optimize
             )
@@ -3171,7 +3288,7 @@ class RouteSessionViewSet(viewsets.ModelViewSet):
             return Response({
                 'success': True,
                 'url': url,
-                'shipment_count': shipments.count()
+                'shipment_count': len(shipments)
             })
         except Exception as e:
             logger.error(f"Failed to generate Google Maps route: {e}", exc_info=True)
@@ -10,7 +10,10 @@ from django.views.decorators.csrf import csrf_exempt
 from rest_framework_simplejwt.authentication import JWTAuthentication
 from apps.authentication.jwt_auth import CookieJWTAuthentication
 from .api_key_auth import APIKeyAuthentication
-from .pops_order_receiver import receive_order_from_pops, update_shipment_status_from_pops
+from .pops_order_receiver import (
+    receive_order_from_pops, receive_orders_from_pops_bulk,
+    update_shipment_status_from_pops, bulk_update_shipment_status_from_pops,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -45,6 +48,10 @@ def _process_batch_shipments(shipments_data, request=None):
         'errors': []
     }
     
+    api_source = getattr(request, 'api_key_source', None) if request else None
+
+    # Validate rows first, then ingest all valid ones in one bulk pass
+    pending = []
     for i, shipment_data in enumerate(shipments_data):
         try:
             # Validate required fields - use orderId instead of id
@@ -67,30 +74,37 @@ def _process_batch_shipments(shipments_data, request=None):
             # Remove 'id' field from shipment_data to prevent it from being used
             # RiderPro will generate its own shipment ID
             shipment_data_clean = {k: v for k, v in shipment_data.items() if k != 'id'}
-            
-            # Process the shipment
-            api_source = getattr(request, 'api_key_source', None) if request else None
-            shipment = receive_order_from_pops(
-                shipment_data_clean, 
-                employee_id, 
-                api_source
-            )
-            
-            if shipment:
-                results['processed'] += 1
-                results['shipment_ids'].append(shipment.id)
-                logger.info(f"Successfully processed shipment orderId={order_id}, shipment_id={shipment.id} for employee {employee_id}")
-            else:
-                error_msg = f"Shipment {i+1} (orderId: {order_id}): Failed to create shipment"
-                results['errors'].append(error_msg)
-                results['failed'] += 1
-                logger.error(error_msg)
+            pending.append((i, order_id, employee_id, shipment_data_clean))
                 
         except Exception as e:
             error_msg = f"Shipment {i+1}: Error processing - {str(e)}"
             results['errors'].append(error_msg)
             results['failed'] += 1
             logger.error(f"Error processing shipment {i+1}: {e}", exc_info=True)
+
+    try:
+        shipments = receive_orders_from_pops_bulk(
+            [(data, employee_id) for _, _, employee_id, data in pending],
+            api_source
+        )
+    except Exception as e:
+        # Fall back to one order at a time so a single bad row can't sink the batch
+        logger.error(f"Bulk order ingest failed, retrying per order: {e}", exc_info=True)
+        shipments = [
+            receive_order_from_pops(data, employee_id, api_source)
+            for _, _, employee_id, data in pending
+        ]
+
+    for (i, order_id, employee_id, _), shipment in zip(pending, shipments):
+        if shipment:
+            results['processed'] += 1
+            results['shipment_ids'].append(shipment.id)
+            logger.info(f"Successfully processed shipment orderId={order_id}, shipment_id={shipment.id} for employee {employee_id}")
+        else:
+            error_msg = f"Shipment {i+1} (orderId: {order_id}): Failed to create shipment"
+            results['errors'].append(error_msg)
+            results['failed'] += 1
+            logger.error(error_msg)
     
     # Update success status based on results
     if results['failed'] > 0 and results['processed'] == 0:
@@ -220,6 +234,79 @@ def receive_order_webhook(request):
         )
 
 
+def _process_status_updates(updates_data):
+    """
+    Apply a list of POPS status payloads in one bulk pass
+
+    Returns:
+        Response with per-update results
+    """
+    from .models import Shipment
+
+    if not updates_data:
+        return Response(
+            {'success': False, 'message': 'Updates must be a non-empty array'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    # Updates without a RiderPro shipment_id are resolved by pops_order_id in one query
+    order_ids = [
+        update.get('order_id') for update in updates_data
+        if isinstance(update, dict) and not update.get('shipment_id') and update.get('order_id')
+    ]
+    shipment_by_order = {}
+    if order_ids:
+        try:
+            shipment_by_order = dict(
+                Shipment.objects.filter(pops_order_id__in=[int(oid) for oid in order_ids])
+                .values_list('pops_order_id', 'id')
+            )
+        except (TypeError, ValueError):
+            return Response(
+                {'success': False, 'message': 'Order IDs must be integers'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+    results = []
+    pending = []
+    for i, update in enumerate(updates_data):
+        if not isinstance(update, dict) or not update.get('order_id') or not update.get('status'):
+            results.append({'index': i, 'success': False, 'message': 'Order ID and status are required'})
+            continue
+        if not isinstance(update['status'], str):
+            results.append({'index': i, 'success': False, 'message': 'Status must be a string'})
+            continue
+        shipment_id = update.get('shipment_id') or shipment_by_order.get(int(update['order_id']))
+        if not shipment_id:
+            results.append({'index': i, 'success': False, 'message': 'Shipment not found'})
+            continue
+        try:
+            shipment_id = int(shipment_id)
+        except (TypeError, ValueError):
+            results.append({'index': i, 'success': False, 'message': 'Shipment ID must be an integer'})
+            continue
+        pending.append((i, shipment_id, update['status'], update['order_id']))
+
+    outcome = bulk_update_shipment_status_from_pops(
+        [(shipment_id, status_value, order_id) for _, shipment_id, status_value, order_id in pending]
+    )
+    for i, shipment_id, _, _ in pending:
+        success = outcome.get(shipment_id, False)
+        results.append({
+            'index': i,
+            'success': success,
+            'message': 'Shipment status updated' if success else 'Shipment not found'
+        })
+
+    results.sort(key=lambda result: result['index'])
+    updated = sum(1 for result in results if result['success'])
+    return Response({
+        'success': updated > 0,
+        'message': f'Updated {updated} of {len(results)} shipments',
+        'results': results
+    }, status=status.HTTP_200_OK if updated else status.HTTP_400_BAD_REQUEST)
+
+
 @api_view(['POST'])
 @authentication_classes(_WEBHOOK_AUTH)
 @permission_classes([IsAuthenticated])
@@ -236,8 +323,14 @@ def order_status_webhook(request):
         "status": "DELIVERED",
         "event": "status_updated"
     }
+
+    Clustered updates can be sent together as {"updates": [<payload>, ...]}
+    and are applied in one bulk pass.
     """
     try:
+        if isinstance(request.data.get('updates'), list):
+            return _process_status_updates(request.data['updates'])
+
         order_id = request.data.get('order_id')
         shipment_id = request.data.get('shipment_id')
         status_value = request.data.get('status')
@@ -64,14 +64,14 @@ class SyncViewSet(viewsets.ViewSet):
                     shipment.synced_to_external = True
                     shipment.sync_status = 'synced'
                     shipment.sync_attempts = 0
-                    shipment.save()
+                    shipment.save(update_fields=['synced_to_external', 'sync_status', 'sync_attempts', 'updated_at'])
                     success_count += 1
                 except Exception as e:
                     logger.error(f"Failed to sync shipment {shipment.id}: {e}")
                     shipment.sync_status = 'failed'
                     shipment.sync_attempts += 1
                     shipment.sync_error = str(e)
-                    shipment.save()
+                    shipment.save(update_fields=['sync_status', 'sync_attempts', 'sync_error', 'updated_at'])
                     failed_count += 1
         
         return Response({
@@ -137,7 +137,7 @@ class SyncViewSet(viewsets.ViewSet):
                 )
                 shipment.synced_to_external = True
                 shipment.sync_status = 'synced'
-                shipment.save()
+                shipment.save(update_fields=['synced_to_external', 'sync_status', 'updated_at'])
                 return Response({
                     'success': True,
                     'message': 'Shipment synced successfully',
@@ -181,7 +181,7 @@ class SyncViewSet(viewsets.ViewSet):
                     )
                     shipment.synced_to_external = True
                     shipment.sync_status = 'synced'
-                    shipment.save()
+                    shipment.save(update_fields=['synced_to_external', 'sync_status', 'updated_at'])
                     processed += 1
             except Exception as e:
                 logger.error(f"Failed to sync shipment {shipment_id}: {e}")
@@ -321,6 +321,11 @@ DATABASES = {
         'PASSWORD': os.environ.get('POSTGRES_PASSWORD', 'password'),
         'HOST': os.environ.get('POSTGRES_HOST', 'postgres'),
         'PORT': os.environ.get('POSTGRES_PORT', '5432'),
+        # Reuse connections across requests instead of reconnecting each time;
+        # health checks drop a connection the server has closed before reuse.
+        # Set DB_CONN_MAX_AGE=0 when running behind pgbouncer in transaction mode.
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
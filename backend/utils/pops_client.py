@@ -3,11 +3,35 @@ POPS API Client for integrating with POPS (Printo Order Processing System)
 """
 import requests
 import logging
+import time
 from typing import Optional, Dict, Any
 from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 logger = logging.getLogger(__name__)
 
+# Keep-alive connections held open to POPS. Status syncs and callbacks run on
+# background threads, so the default pool of 10 gets exhausted under batch
+# updates and extra connections are opened and thrown away.
+POPS_HTTP_POOL_SIZE = 32
+
+# Transport-level retries for transient POPS gateway errors, honouring
+# Retry-After. Status retries apply only to idempotent methods (urllib3's
+# default), so order POST/PATCH calls are never replayed here; the final
+# response is returned rather than raised once retries run out.
+POPS_HTTP_RETRY = Retry(
+    total=3,
+    backoff_factor=0.2,
+    status_forcelist=(502, 503, 504),
+    raise_on_status=False,
+)
+
+# How long a service token that passed token-verify is trusted before it is
+# verified again. Every status sync asks for the token, and verifying it each
+# time doubled the POPS round trips per sync.
+SERVICE_TOKEN_VERIFY_INTERVAL = 300
+
 
 class PopsAPIClient:
     """Client for interacting with POPS API"""
@@ -15,6 +39,9 @@ class PopsAPIClient:
     def __init__(self, base_url: Optional[str] = None):
         self.base_url = base_url or getattr(settings, 'POPS_API_BASE_URL', 'http://localhost:8002/api/v1')
         self.session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=POPS_HTTP_POOL_SIZE, max_retries=POPS_HTTP_RETRY)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
         self.session.headers.update({
             'Content-Type': 'application/json',
         })
@@ -140,14 +167,20 @@ class PopsAPIClient:
         """
         if not hasattr(self, '_service_token'):
             self._service_token = getattr(settings, 'RIDER_PRO_SERVICE_TOKEN', None) or None
+            self._service_token_verified_at = None
             
-        # If we have a token, check its validity
+        # If we have a token, check its validity (at most every SERVICE_TOKEN_VERIFY_INTERVAL)
         if self._service_token:
+            verified_at = self._service_token_verified_at
+            if verified_at is not None and time.monotonic() - verified_at < SERVICE_TOKEN_VERIFY_INTERVAL:
+                return self._service_token
             if self.verify_token(self._service_token) is not None:
+                self._service_token_verified_at = time.monotonic()
                 return self._service_token
             else:
                 logger.info("Cached POPS service token is invalid or expired. Attempting dynamic login.")
                 self._service_token = None
+                self._service_token_verified_at = None
                 
         # Attempt service account login
         email = getattr(settings, 'POPS_SERVICE_EMAIL', None)
@@ -159,6 +192,7 @@ class PopsAPIClient:
             if login_res and login_res.get('access'):
                 token = login_res.get('access')
                 self._service_token = token
+                self._service_token_verified_at = time.monotonic()
                 # Sync back to Django settings so raw accesses are kept in step
                 try:
                     setattr(settings, 'RIDER_PRO_SERVICE_TOKEN', token)
@@ -172,6 +206,10 @@ class PopsAPIClient:
 
         return None
 
+    def recheck_service_token(self) -> None:
+        """Verify the service token again on next use (e.g. after a rejected call)"""
+        self._service_token_verified_at = None
+
     def create_order(self, order_data: Dict[str, Any], access_token: str) -> Optional[Dict[str, Any]]:
         """
         Create order in POPS